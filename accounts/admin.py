@@ -1,5 +1,41 @@
 from django.contrib import admin
+from django.db.models import Q
+from core.paginator import EstimatedCountPaginator
 from .models import UserBankAccount, UserAddress
 # Register your models here.
-admin.site.register(UserBankAccount)
-admin.site.register(UserAddress)
+def account_search_q(term, prefix=''):
+    """Match an exact account number, email or username with a single indexed lookup."""
+    term = term.strip()
+    if term.isdigit():
+        return Q(**{f'{prefix}account_no': int(term)})
+    if '@' in term:
+        return Q(**{f'{prefix}user__email': term})
+    return Q(**{f'{prefix}user__username': term})
+
+class AccountSearchMixin:
+    search_prefix = ''
+    search_help_text = 'Exact account number, username or email.'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(account_search_q(search_term, self.search_prefix)), False
+
+@admin.register(UserBankAccount)
+class UserBankAccountAdmin(AccountSearchMixin, admin.ModelAdmin):
+    list_display = ['account_no', 'user', 'account_type', 'balance', 'active_loan_count', 'pending_loan_count']
+    list_select_related = ['user']
+    list_filter = ['account_type']
+    search_fields = ['account_no']
+    raw_id_fields = ['user']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(UserAddress)
+class UserAddressAdmin(admin.ModelAdmin):
+    list_display = ['user', 'city', 'country']
+    list_select_related = ['user']
+    search_fields = ['user__username__exact', 'user__email__exact']
+    raw_id_fields = ['user']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
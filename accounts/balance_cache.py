@@ -0,0 +1,87 @@
+"""Write-through cache of account balances, keyed by user id.
+
+Each entry is ``(balance_version, balance)``. The posting engine bumps
+``UserBankAccount.balance_version`` with every balance change and writes the
+new balance here once the transaction commits. Entries are only written
+with ``cache.add``; a writer that finds an older entry deletes it first, and
+one whose ``add`` loses a race deletes the key rather than guess which value
+is newer, so out-of-order commits can't leave a stale balance behind. Direct
+saves of an account just drop the entry.
+
+Every worker must see the same entries, so balances are only cached in a
+shared backend (``CACHE_URL``); with the per-process locmem default they are
+read from the database. ``BALANCE_CACHE_ENABLED`` overrides the detection.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import UserBankAccount
+
+
+def balance_key(user_id):
+    return f'account_balance:{user_id}'
+
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def balance_ttl():
+    return getattr(settings, 'BALANCE_CACHE_TTL', 300)
+
+
+def caching_enabled():
+    enabled = getattr(settings, 'BALANCE_CACHE_ENABLED', None)
+    if enabled is None:
+        return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+    return enabled
+
+
+def get_balance(user):
+    """The user's balance, from the cache when possible; ``None`` without an account."""
+    enabled = caching_enabled()
+    if enabled:
+        cached = cache.get(balance_key(user.pk))
+        if cached is not None:
+            return cached[1]
+    # Read (and fill) from the primary so a lagging replica can't seed the cache.
+    row = (
+        UserBankAccount.objects.using(DEFAULT_DB_ALIAS)
+        .filter(user_id=user.pk)
+        .values_list('balance_version', 'balance')
+        .first()
+    )
+    if row is None:
+        return None
+    if enabled:
+        cache.add(balance_key(user.pk), row, balance_ttl())
+    return row[1]
+
+
+def store_balances(entries):
+    """Cache ``(user_id, version, balance)`` entries unless a newer version is cached."""
+    if not caching_enabled():
+        return
+    for user_id, version, balance in entries:
+        key = balance_key(user_id)
+        cached = cache.get(key)
+        if cached is not None:
+            if cached[0] >= version:
+                continue
+            cache.delete(key)
+        if not cache.add(key, (version, balance), balance_ttl()):
+            # Another writer or a reader's fill got in first.
+            cache.delete(key)
+
+
+def store_balances_on_commit(entries):
+    entries = list(entries)
+    transaction.on_commit(lambda: store_balances(entries))
+
+
+def invalidate_balance(user_id):
+    if caching_enabled():
+        cache.delete(balance_key(user_id))
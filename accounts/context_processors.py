@@ -0,0 +1,11 @@
+from .balance_cache import get_balance
+
+
+def account_balance(request):
+    """Expose ``account_balance`` without loading the account row."""
+    def balance():
+        if not request.user.is_authenticated:
+            return ''
+        value = get_balance(request.user)
+        return '' if value is None else value
+    return {'account_balance': balance}
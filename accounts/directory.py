@@ -0,0 +1,61 @@
+"""Account number directory used to resolve and pre-validate transfer recipients.
+
+Lookups go through the Django cache, keyed by ``account_no``; numbers that
+don't exist are cached too, so repeated typos don't reach the database.
+Entries are dropped when an account is created or deleted (see
+``accounts.signals``); bulk inserts call ``forget_accounts`` themselves.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import UserBankAccount
+
+MISSING = {}
+
+
+def directory_key(account_no):
+    return f'account_directory:{account_no}'
+
+
+def directory_ttl():
+    return getattr(settings, 'ACCOUNT_DIRECTORY_TTL', 300)
+
+
+def mask_name(name):
+    """``'Joyant Sarker'`` -> ``'J***** S*****'``."""
+    return ' '.join(part[0] + '*' * (len(part) - 1) for part in name.split())
+
+
+def lookup_account(account_no):
+    """``{'pk', 'user_id', 'name'}`` for ``account_no``, or ``None`` if there is no such account."""
+    key = directory_key(account_no)
+    entry = cache.get(key)
+    if entry is None:
+        row = (
+            UserBankAccount.objects.filter(account_no=account_no)
+            .values('pk', 'user_id', 'user__first_name', 'user__last_name', 'user__username')
+            .first()
+        )
+        if row is None:
+            entry = MISSING
+        else:
+            full_name = f"{row['user__first_name']} {row['user__last_name']}".strip()
+            entry = {
+                'pk': row['pk'],
+                'user_id': row['user_id'],
+                'name': mask_name(full_name or row['user__username']),
+            }
+        cache.set(key, entry, directory_ttl())
+    return entry or None
+
+
+def resolve_account(account_no):
+    """An unsaved ``UserBankAccount`` carrying just the ids the posting engine needs."""
+    entry = lookup_account(account_no)
+    if entry is None:
+        return None
+    return UserBankAccount(pk=entry['pk'], user_id=entry['user_id'], account_no=account_no)
+
+
+def forget_accounts(account_numbers):
+    cache.delete_many([directory_key(account_no) for account_no in account_numbers])
@@ -1,8 +1,10 @@
 from django.contrib.auth.forms import UserCreationForm
 from django import forms
+from django.db import transaction
 from . constants import GENDER_TYPE, ACCOUNT_TYPE
 from django.contrib.auth.models import User
 from .models import UserBankAccount, UserAddress
+from .numbering import reserve_account_numbers
 
 class UserRegistrationForm(UserCreationForm):
     birth_day = forms.DateField(widget=forms.DateInput(attrs={'type':'date'}))
@@ -19,7 +21,8 @@ class UserRegistrationForm(UserCreationForm):
     def save(self, commit=True):
         our_user = super().save(commit=False)
         if commit == True:
-            our_user.save()
+            # Reserved up front, so the account no longer waits on the user id.
+            account_no = reserve_account_numbers(1)[0]
             account_type = self.cleaned_data.get('account_type')
             gender = self.cleaned_data.get('gender')
             postal_code = self.cleaned_data.get('postal_code')
@@ -27,22 +30,23 @@ class UserRegistrationForm(UserCreationForm):
             birth_day = self.cleaned_data.get('birth_day')
             city = self.cleaned_data.get('city')
             street_address = self.cleaned_data.get('street_address')
-            
 
-            UserAddress.objects.create(
-                user = our_user,
-                postal_code = postal_code,
-                country = country,
-                city = city,
-                street_address = street_address
-            )
-            UserBankAccount.objects.create(
-                user = our_user,
-                account_type = account_type,
-                gender = gender, 
-                birth_day = birth_day,
-                account_no = 1000000 + our_user.id
-            )
+            with transaction.atomic():
+                our_user.save()
+                UserAddress.objects.create(
+                    user = our_user,
+                    postal_code = postal_code,
+                    country = country,
+                    city = city,
+                    street_address = street_address
+                )
+                UserBankAccount.objects.create(
+                    user = our_user,
+                    account_type = account_type,
+                    gender = gender,
+                    birth_day = birth_day,
+                    account_no = account_no
+                )
         return our_user
     
     def __init__(self, *args, **kwargs):
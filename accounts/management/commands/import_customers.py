@@ -0,0 +1,114 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.onboarding import REQUIRED_COLUMNS, RowError, clean_row, create_customers, hash_passwords
+from core.parallel import default_workers, run_in_pool
+
+
+def split(items, parts):
+    size = -(-len(items) // parts) or 1
+    return [items[offset:offset + size] for offset in range(0, len(items), size)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Import customers from a CSV with columns username, password, email, first_name, '
+        'last_name, account_type, birth_day, gender, street_address, city, postal_code, country. '
+        'Each chunk is created atomically; a rerun resumes after the last committed chunk.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=default_workers(), help='Processes used to hash passwords.')
+        parser.add_argument('--checkpoint', help='Progress file (default: <path>.checkpoint).')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from the first row.')
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint'] or f"{options['path']}.checkpoint"
+        done = 0 if options['restart'] else self.load_checkpoint(checkpoint, options['path'])
+        if done:
+            self.stdout.write(f'Resuming after row {done}.')
+
+        created = skipped = rejected = read = 0
+        started = time.perf_counter()
+        with open(options['path'], newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            missing = [name for name in REQUIRED_COLUMNS if name not in (reader.fieldnames or ())]
+            if missing:
+                raise CommandError(f"The CSV is missing columns: {', '.join(missing)}")
+            rows = islice(reader, done, None)
+
+            while True:
+                chunk = list(islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+                valid = []
+                seen = set()
+                for offset, row in enumerate(chunk):
+                    # +2: the header is line 1 and lines are 1-based.
+                    line = done + offset + 2
+                    try:
+                        cleaned = clean_row(row)
+                    except RowError as e:
+                        self.stderr.write(f'Line {line}: {e}')
+                        rejected += 1
+                        continue
+                    if cleaned['username'] in seen:
+                        self.stderr.write(f"Line {line}: duplicate username {cleaned['username']!r} in the file.")
+                        rejected += 1
+                        continue
+                    seen.add(cleaned['username'])
+                    valid.append(cleaned)
+
+                # Rows already imported (e.g. a chunk that committed just before a
+                # crash, or customers who registered themselves) are skipped.
+                existing = set(User.objects.filter(username__in=seen).values_list('username', flat=True))
+                skipped += len(existing)
+                valid = [row for row in valid if row['username'] not in existing]
+
+                if valid:
+                    passwords = [row['password'] or None for row in valid]
+                    tasks = [(part,) for part in split(passwords, options['workers'])]
+                    hashes = [
+                        password
+                        for batch in run_in_pool(hash_passwords, tasks, options['workers'])
+                        for password in batch
+                    ]
+                    create_customers(valid, hashes)
+                    created += len(valid)
+
+                done += len(chunk)
+                read += len(chunk)
+                self.save_checkpoint(checkpoint, options['path'], done)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{done} rows processed, {created} customers created ({read / elapsed:,.0f} rows/sec)')
+
+        elapsed = time.perf_counter() - started
+        rate = read / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} customers, skipped {skipped} existing, rejected {rejected} rows '
+            f'in {elapsed:.2f}s ({rate:,.0f} rows/sec).'
+        ))
+
+    def load_checkpoint(self, checkpoint, path):
+        try:
+            with open(checkpoint) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return 0
+        if state.get('source') != os.path.abspath(path):
+            raise CommandError(f'{checkpoint} belongs to {state.get("source")}; pass --checkpoint or --restart.')
+        return state['rows']
+
+    def save_checkpoint(self, checkpoint, path, rows):
+        tmp = f'{checkpoint}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'source': os.path.abspath(path), 'rows': rows}, f)
+        os.replace(tmp, checkpoint)
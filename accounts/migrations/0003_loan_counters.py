@@ -0,0 +1,28 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_useraddress_city'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userbankaccount',
+            name='active_loan_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userbankaccount',
+            name='outstanding_loan_principal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='userbankaccount',
+            name='pending_loan_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
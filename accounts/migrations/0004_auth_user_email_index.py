@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Index auth_user.email so the admin's exact email search is index-backed."""
+
+    dependencies = [
+        ('accounts', '0003_loan_counters'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX accounts_auth_user_email_idx ON auth_user (email)',
+            reverse_sql='DROP INDEX accounts_auth_user_email_idx',
+        ),
+    ]
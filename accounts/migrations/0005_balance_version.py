@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_auth_user_email_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userbankaccount',
+            name='balance_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:40
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_sequence(apps, schema_editor):
+    UserBankAccount = apps.get_model('accounts', 'UserBankAccount')
+    AccountNumberSequence = apps.get_model('accounts', 'AccountNumberSequence')
+    db_alias = schema_editor.connection.alias
+    highest = UserBankAccount.objects.using(db_alias).aggregate(highest=Max('account_no'))['highest'] or 1000000
+    AccountNumberSequence.objects.using(db_alias).create(name='account_no', next_value=highest + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_balance_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountNumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(seed_sequence, migrations.RunPython.noop),
+    ]
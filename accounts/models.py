@@ -11,11 +11,26 @@ class UserBankAccount(models.Model):
     gender = models.CharField(max_length=10, choices=GENDER_TYPE)
     initial_deposite_date = models.DateField(auto_now=True)
     balance = models.DecimalField(default=0, max_digits=12, decimal_places=2)
+    # Maintained by transactions.posting; rebuild with `manage.py rebuild_loan_counters`.
+    active_loan_count = models.PositiveIntegerField(default=0)
+    pending_loan_count = models.PositiveIntegerField(default=0)
+    outstanding_loan_principal = models.DecimalField(default=0, max_digits=12, decimal_places=2)
+    # Bumped with every posted balance change; stamps the cached balance.
+    balance_version = models.PositiveBigIntegerField(default=0)
 
     def __str__(self):
         return str(self.account_no)
     
 
+class AccountNumberSequence(models.Model):
+    """Next free account number; see ``accounts.numbering.reserve_account_numbers``."""
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField()
+
+    def __str__(self):
+        return f'{self.name}: {self.next_value}'
+
+
 class UserAddress(models.Model):
     user = models.OneToOneField(User, related_name='address', on_delete=models.CASCADE)
     street_address = models.CharField(max_length=100)
@@ -0,0 +1,30 @@
+"""Account number allocation.
+
+Numbers are handed out in blocks from a locked ``AccountNumberSequence`` row,
+so the account number is known before the user row is inserted and a bulk
+import can reserve a whole chunk's numbers in one short transaction. Numbers
+from a block whose insert fails are simply never used.
+"""
+from django.db import transaction
+from django.db.models import Max
+
+from .models import AccountNumberSequence, UserBankAccount
+
+ACCOUNT_NO_SEQUENCE = 'account_no'
+ACCOUNT_NO_BASE = 1000000
+
+
+def reserve_account_numbers(count):
+    """Reserve ``count`` consecutive unused account numbers and return them as a range."""
+    with transaction.atomic():
+        sequence, _ = (
+            AccountNumberSequence.objects.select_for_update()
+            .get_or_create(name=ACCOUNT_NO_SEQUENCE, defaults={'next_value': ACCOUNT_NO_BASE + 1})
+        )
+        # Accounts created before the sequence existed used 1000000 + user id;
+        # never hand out a number at or below the highest one in use.
+        highest = UserBankAccount.objects.aggregate(highest=Max('account_no'))['highest'] or ACCOUNT_NO_BASE
+        start = max(sequence.next_value, highest + 1)
+        sequence.next_value = start + count
+        sequence.save(update_fields=['next_value'])
+    return range(start, start + count)
@@ -0,0 +1,29 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .balance_cache import invalidate_balance
+from .directory import forget_accounts
+from .models import UserBankAccount
+
+
+@receiver(post_init, sender=UserBankAccount)
+def remember_account_no(sender, instance, **kwargs):
+    # Read from __dict__ so accounts loaded with only()/defer() don't query.
+    instance._stored_account_no = instance.__dict__.get('account_no')
+
+
+@receiver(post_save, sender=UserBankAccount)
+@receiver(post_delete, sender=UserBankAccount)
+def account_changed(sender, instance, **kwargs):
+    # A renumbered account must stop resolving under its old number too.
+    numbers = {instance.account_no, getattr(instance, '_stored_account_no', None)} - {None}
+    instance._stored_account_no = instance.account_no
+    user_id = instance.user_id
+
+    # Saves outside the posting engine don't bump balance_version, so drop
+    # the cached balance instead of trying to write it through.
+    def invalidate():
+        invalidate_balance(user_id)
+        forget_accounts(numbers)
+    transaction.on_commit(invalidate)
@@ -1,3 +1,169 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from transactions.posting import post_deposit
+from .balance_cache import balance_key, get_balance, store_balances
+from .forms import UserRegistrationForm
+from .models import UserBankAccount
+
+
+def create_accounts(start, count):
+    for i in range(start, start + count):
+        user = User.objects.create(username=f'user{i}', email=f'user{i}@example.com')
+        UserBankAccount.objects.create(user=user, account_type='Savings', gender='Male', account_no=1000000 + user.pk)
+
+
+class UserBankAccountAdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('staff', 'staff@example.com', 'pass12345'))
+        self.url = reverse('admin:accounts_userbankaccount_changelist')
+
+    def count_queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_query_count_does_not_grow_with_rows(self):
+        create_accounts(0, 3)
+        few = self.count_queries()
+        create_accounts(3, 20)
+        self.assertEqual(self.count_queries(), few)
+
+    def test_search_by_account_no_username_and_email(self):
+        create_accounts(0, 3)
+        account = UserBankAccount.objects.select_related('user').last()
+        for term in (account.account_no, account.user.username, account.user.email):
+            response = self.client.get(self.url, {'q': term})
+            self.assertEqual(list(response.context['cl'].result_list), [account])
+
+
+# One process, so locmem is shared by everything the tests run.
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    BALANCE_CACHE_ENABLED=True,
+)
+class BalanceCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        create_accounts(0, 1)
+        self.account = UserBankAccount.objects.select_related('user').get()
+        self.user = self.account.user
+
+    def test_posting_writes_the_new_balance_through_on_commit(self):
+        self.assertEqual(get_balance(self.user), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            post_deposit(self.account, Decimal('750'))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_balance(self.user), Decimal('750'))
+
+    def test_older_versions_never_replace_newer_ones(self):
+        store_balances([(self.user.pk, 5, Decimal('100'))])
+        store_balances([(self.user.pk, 4, Decimal('40'))])
+        self.assertEqual(get_balance(self.user), Decimal('100'))
+
+    def test_newer_versions_replace_older_ones(self):
+        store_balances([(self.user.pk, 3, Decimal('30'))])
+        store_balances([(self.user.pk, 5, Decimal('50'))])
+        self.assertEqual(cache.get(balance_key(self.user.pk)), (5, Decimal('50')))
+
+    @override_settings(BALANCE_CACHE_ENABLED=None)
+    def test_process_local_cache_is_not_used(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post_deposit(self.account, Decimal('750'))
+        self.assertIsNone(cache.get(balance_key(self.user.pk)))
+        # Another worker's posting is seen at once, with no invalidation reaching this process.
+        UserBankAccount.objects.filter(pk=self.account.pk).update(balance=Decimal('20'))
+        with self.assertNumQueries(1):
+            self.assertEqual(get_balance(self.user), Decimal('20'))
+
+    def test_saving_the_account_drops_the_cached_balance(self):
+        store_balances([(self.user.pk, 1, Decimal('100'))])
+        with self.captureOnCommitCallbacks(execute=True):
+            UserBankAccount.objects.filter(pk=self.account.pk).update(balance=Decimal('20'))
+            self.account.refresh_from_db()
+            self.account.save()
+        self.assertEqual(get_balance(self.user), Decimal('20'))
+
+    def test_navbar_balance_does_not_load_the_account(self):
+        self.client.force_login(self.user)
+        get_balance(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('deposit_money'))
+        self.assertContains(response, '(balance : 0')
+        self.assertFalse([q for q in queries if 'accounts_userbankaccount' in q['sql']])
+
+    def test_cached_navbar_follows_balance_changes(self):
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('deposit_money')), '(balance : 0.00)')
+        with self.captureOnCommitCallbacks(execute=True):
+            post_deposit(self.account, Decimal('750'))
+        self.assertContains(self.client.get(reverse('deposit_money')), '(balance : 750.00)')
+
+
+class ImportCustomersTests(TestCase):
+    HEADER = 'username,password,email,first_name,last_name,account_type,birth_day,gender,street_address,city,postal_code,country\n'
+
+    def write_csv(self, lines):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.HEADER + ''.join(lines))
+        self.addCleanup(os.remove, path)
+        self.addCleanup(lambda: os.path.exists(path + '.checkpoint') and os.remove(path + '.checkpoint'))
+        return path
+
+    def customer(self, i, **overrides):
+        row = {
+            'username': f'imported{i}', 'password': 'Secret-123', 'email': f'imported{i}@example.com',
+            'first_name': 'Imported', 'last_name': str(i), 'account_type': 'Savings', 'birth_day': '1990-01-31',
+            'gender': 'Female', 'street_address': 'Road 1', 'city': 'Dhaka', 'postal_code': '1205', 'country': 'Bangladesh',
+        }
+        row.update(overrides)
+        return ','.join(row.values()) + '\n'
+
+    def test_imports_in_chunks_and_rejects_bad_rows(self):
+        create_accounts(0, 2)
+        path = self.write_csv([self.customer(1), self.customer(2, gender='Other'), self.customer(3), self.customer(4)])
+        call_command('import_customers', path, chunk_size=2, workers=1, stdout=StringIO(), stderr=StringIO())
+
+        accounts = UserBankAccount.objects.filter(user__username__startswith='imported').select_related('user', 'user__address')
+        self.assertEqual(sorted(a.user.username for a in accounts), ['imported1', 'imported3', 'imported4'])
+        self.assertTrue(all(a.user.check_password('Secret-123') for a in accounts))
+        self.assertEqual(accounts[0].user.address.city, 'Dhaka')
+        numbers = list(UserBankAccount.objects.values_list('account_no', flat=True))
+        self.assertEqual(len(numbers), len(set(numbers)))
+
+    def test_resumes_after_the_checkpoint(self):
+        path = self.write_csv([self.customer(i) for i in range(1, 5)])
+        with open(path + '.checkpoint', 'w') as f:
+            json.dump({'source': os.path.abspath(path), 'rows': 2}, f)
+        call_command('import_customers', path, chunk_size=10, workers=1, stdout=StringIO())
+        self.assertEqual(
+            sorted(User.objects.filter(username__startswith='imported').values_list('username', flat=True)),
+            ['imported3', 'imported4'],
+        )
+        with open(path + '.checkpoint') as f:
+            self.assertEqual(json.load(f)['rows'], 4)
+
+    def test_registration_numbers_come_after_existing_accounts(self):
+        create_accounts(0, 3)
+        form = UserRegistrationForm(data={
+            'username': 'newcomer', 'password1': 'Secret-123x', 'password2': 'Secret-123x',
+            'first_name': 'New', 'last_name': 'Comer', 'email': 'newcomer@example.com',
+            'account_type': 'Current', 'birth_day': '1995-05-05', 'gender': 'Male',
+            'postal_code': 1000, 'street_address': 'Road 2', 'city': 'Dhaka', 'country': 'Bangladesh',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        account = form.save().account
+        self.assertGreater(account.account_no, max(a.account_no for a in UserBankAccount.objects.exclude(pk=account.pk)))
@@ -9,18 +9,17 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
 from django.contrib import messages
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
+from django.db import transaction
+from core.outbox import queue_email, render_email
 
 def send_passchange_email(user, subject, template):
-    message = render_to_string(template, {
+    message = render_email(template, {
         'user' : user,
     })
-    send_email = EmailMultiAlternatives(subject, message, to=[user.email])
-    send_email.attach_alternative(message, 'text/html')
-    send_email.send()
+    queue_email(subject, message, user.email, html_message=message)
 
 @login_required
+@transaction.atomic
 def pass_change(request):
     form = PasswordChangeForm(user=request.user, data=request.POST)
     if request.user.is_authenticated:
@@ -61,6 +60,7 @@ class UserLogoutView(LogoutView):
 
 class UserBankAccountUpdateView(View):
     template_name = 'accounts/profile.html'
+    use_replica = True
 
     def get(self, request):
         form = UserUpdateForm(instance=request.user)
@@ -0,0 +1,76 @@
+"""Read-replica routing.
+
+Views opt in with ``use_replica = True``. ``ReplicaRoutingMiddleware`` turns
+routing on for safe requests to those views, and ``PrimaryReplicaRouter``
+then sends their reads to the ``REPLICA_DATABASE_ALIAS`` database. After a
+request that wrote to the database (any unsafe method, or a GET whose view
+wrote, as ``db_for_write`` records) the user is pinned to the primary for
+``REPLICA_PIN_SECONDS`` (tracked in the session), so they always read their
+own writes.
+"""
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PIN_SESSION_KEY = 'db_primary_until'
+
+reading_from_replica = ContextVar('reading_from_replica', default=False)
+# Mutable per-request flag, so writes made in a copied context are still seen.
+request_writes = ContextVar('request_writes', default=None)
+
+
+def replica_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', None)
+    return alias if alias in settings.DATABASES else None
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        writes = request_writes.get()
+        if reading_from_replica.get() and not (writes and writes['wrote']):
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        writes = request_writes.get()
+        if writes is not None:
+            writes['wrote'] = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.use_replica = False
+        writes = {'wrote': False}
+        token = reading_from_replica.set(False)
+        writes_token = request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_writes.reset(writes_token)
+            reading_from_replica.reset(token)
+        wrote = writes['wrote'] or request.method not in self.safe_methods
+        if replica_alias() and wrote and hasattr(request, 'session'):
+            request.session[PIN_SESSION_KEY] = time.time() + getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        if (
+            replica_alias()
+            and request.method in self.safe_methods
+            and getattr(view, 'use_replica', False)
+            and request.session.get(PIN_SESSION_KEY, 0) < time.time()
+        ):
+            request.use_replica = True
+            reading_from_replica.set(True)
@@ -0,0 +1,32 @@
+"""Settings for running the test suite locally without Postgres or SMTP.
+
+    python manage.py test --settings=coder_bank.settings_test
+
+Two SQLite databases stand in for the primary and the read replica. Replica
+routing is off unless a test enables it with REPLICA_DATABASE_ALIAS.
+"""
+import os
+
+for name in ('SECRET_KEY', 'DB_NAME', 'DB_USER', 'DB_PASSWORD', 'DB_HOST', 'DB_PORT', 'EMAIL', 'EMAIL_PASSWORD'):
+    os.environ.setdefault(name, 'test')
+
+from .settings import *  # noqa: E402,F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test-default.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test-replica.sqlite3',
+    },
+}
+REPLICA_DATABASE_ALIAS = None
+
+# Rolled-back tests reuse primary keys, so a shared cache would leak cached
+# balances between tests; tests that exercise the cache override this.
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
@@ -16,9 +16,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from core.views import HomeView
+from core.views import HomeView, metrics_view
 urlpatterns = [
     path('', HomeView.as_view(), name="home"),
+    path('metrics', metrics_view, name="metrics"),
     path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls')),
     path('transactions/', include('transactions.urls')),
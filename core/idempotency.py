@@ -0,0 +1,113 @@
+"""``Idempotency-Key`` support for money-moving POST endpoints.
+
+The first request with a given key runs normally; its response is stored in
+``IdempotencyKey`` in the same database transaction as the view's writes.
+Retries with the same key get the stored response back without running the
+view again. Recently used keys are also kept in an in-process LRU so a replay
+usually doesn't touch the database at all.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .lru import LRUCache
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+STORED_HEADERS = ('Content-Type', 'Location')
+
+recent_responses = LRUCache(getattr(settings, 'IDEMPOTENCY_LRU_SIZE', 10000))
+
+
+def replay(stored):
+    response = HttpResponse(stored['body'], status=stored['status'])
+    for name, value in stored['headers'].items():
+        response[name] = value
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def stored_from_record(record):
+    return {
+        'path': record.path,
+        'status': record.status_code,
+        'headers': record.response_headers,
+        'body': bytes(record.response_body),
+        'expires_at': record.expires_at,
+    }
+
+
+class IdempotencyMixin:
+    """View mixin that makes POSTs replay-safe when an Idempotency-Key is sent."""
+    idempotent_methods = ('POST',)
+
+    def dispatch(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or request.method not in self.idempotent_methods or not request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+        if len(key) > 255:
+            return JsonResponse({'error': f'{HEADER} must be at most 255 characters.'}, status=400)
+
+        cache_key = (request.user.pk, key)
+        stored = recent_responses.get(cache_key)
+        if stored is None:
+            record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if record is not None:
+                stored = stored_from_record(record)
+                recent_responses.set(cache_key, stored)
+
+        if stored is not None and stored['expires_at'] <= timezone.now():
+            IdempotencyKey.objects.filter(user=request.user, key=key, expires_at__lte=timezone.now()).delete()
+            recent_responses.pop(cache_key)
+            stored = None
+
+        if stored is not None:
+            if stored['path'] != request.path:
+                return JsonResponse({'error': f'This {HEADER} was already used for another request.'}, status=422)
+            return replay(stored)
+
+        try:
+            with transaction.atomic():
+                response = super().dispatch(request, *args, **kwargs)
+                if response.status_code >= 500 or response.streaming:
+                    transaction.set_rollback(True)
+                    return response
+                if hasattr(response, 'render') and not response.is_rendered:
+                    response.render()
+                record = IdempotencyKey.objects.create(
+                    user=request.user,
+                    key=key,
+                    path=request.path,
+                    status_code=response.status_code,
+                    response_headers={name: response[name] for name in STORED_HEADERS if response.has_header(name)},
+                    response_body=response.content,
+                    expires_at=timezone.now() + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400)),
+                )
+        except IntegrityError:
+            # A concurrent request with the same key committed first.
+            record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if record is None:
+                raise
+            stored = stored_from_record(record)
+            recent_responses.set(cache_key, stored)
+            return replay(stored)
+
+        recent_responses.set(cache_key, stored_from_record(record))
+        return response
+
+
+def purge_expired_keys(batch_size=1000):
+    """Delete expired keys in batches; returns how many were deleted."""
+    deleted = 0
+    now = timezone.now()
+    while True:
+        batch = list(
+            IdempotencyKey.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
@@ -0,0 +1,142 @@
+"""In-process request metrics exposed in the Prometheus text format.
+
+Every thread records into its own shard, so recording never takes a lock;
+``render_metrics`` merges the shards when ``/metrics`` is scraped. The shards
+of threads that have exited are folded into one retired total whenever a new
+thread starts recording, so thread-per-request servers don't grow the list.
+
+Processes that don't serve ``/metrics`` (``send_outbox``) record into
+``SharedHistogram`` rows with ``record_shared`` instead, which the endpoint
+merges in. Latency percentiles come from the histograms, e.g.::
+
+    histogram_quantile(0.99, rate(coderbank_view_duration_seconds_bucket{view="transfer"}[5m]))
+"""
+import json
+import threading
+from bisect import bisect_left
+
+from django.db import transaction
+
+from .models import SharedHistogram
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+HISTOGRAMS = {
+    'coderbank_view_duration_seconds': ('Time spent handling a request, by URL name.', LATENCY_BUCKETS),
+    'coderbank_view_db_queries': ('Database queries per request, by URL name.', COUNT_BUCKETS),
+    'coderbank_view_db_duration_seconds': ('Time spent in database queries per request, by URL name.', LATENCY_BUCKETS),
+    'coderbank_smtp_send_duration_seconds': ('Time spent sending one email over SMTP.', LATENCY_BUCKETS),
+}
+
+_local = threading.local()
+_lock = threading.Lock()
+# Live threads' shards, and the merged shards of threads that have exited.
+_shards = {}
+_retired = {}
+
+
+def _merge(merged, key, counts, total):
+    if key in merged:
+        merged_counts, merged_total = merged[key]
+        merged[key] = ([a + b for a, b in zip(merged_counts, counts)], merged_total + total)
+    else:
+        merged[key] = (list(counts), total)
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = {}
+        with _lock:
+            for thread in [thread for thread in _shards if not thread.is_alive()]:
+                for key, (counts, total) in _shards.pop(thread).items():
+                    _merge(_retired, key, counts, total)
+            _shards[threading.current_thread()] = shard
+    return shard
+
+
+def observe(name, value, **labels):
+    """Record ``value`` in histogram ``name`` for the given labels."""
+    key = (name, tuple(sorted(labels.items())))
+    shard = _shard()
+    series = shard.get(key)
+    if series is None:
+        buckets = HISTOGRAMS[name][1]
+        # [per-bucket counts..., +Inf count], sum
+        series = shard[key] = [[0] * (len(buckets) + 1), 0.0]
+    series[0][bisect_left(HISTOGRAMS[name][1], value)] += 1
+    series[1] += value
+
+
+def collect():
+    """Merge all thread shards into ``{(name, labels): (bucket_counts, sum)}``."""
+    with _lock:
+        merged = {key: (list(counts), total) for key, (counts, total) in _retired.items()}
+        shards = list(_shards.values())
+    for shard in shards:
+        for key, (counts, total) in list(shard.items()):
+            _merge(merged, key, counts, total)
+    return merged
+
+
+def record_shared(name, values, **labels):
+    """Add ``values`` to the database-backed series ``name``, in one locked read-modify-write."""
+    if not values:
+        return
+    buckets = HISTOGRAMS[name][1]
+    with transaction.atomic():
+        series, _ = SharedHistogram.objects.select_for_update().get_or_create(
+            name=name, labels=json.dumps(sorted(labels.items())),
+            defaults={'counts': [0] * (len(buckets) + 1)},
+        )
+        for value in values:
+            series.counts[bisect_left(buckets, value)] += 1
+            series.total += value
+        series.save(update_fields=['counts', 'total', 'updated_at'])
+
+
+def collect_shared():
+    """``collect()`` for the ``SharedHistogram`` series."""
+    return {
+        (series.name, tuple(tuple(pair) for pair in json.loads(series.labels))): (series.counts, series.total)
+        for series in SharedHistogram.objects.filter(name__in=list(HISTOGRAMS))
+    }
+
+
+def format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in items
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def render_metrics():
+    merged = collect()
+    for key, (counts, total) in collect_shared().items():
+        _merge(merged, key, counts, total)
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (series_name, labels), (counts, total) in sorted(merged.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _retired.clear()
+        for shard in _shards.values():
+            shard.clear()
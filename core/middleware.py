@@ -0,0 +1,43 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from .metrics import observe
+
+# The method is client-supplied; anything else is recorded as "other" so it
+# cannot create new series.
+METHOD_LABELS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+
+class MetricsMiddleware:
+    """Record latency, query count and query time for every request by URL name."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = {'queries': 0, 'seconds': 0.0}
+
+        def count_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                stats['queries'] += 1
+                stats['seconds'] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(count_query))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+        method = request.method if request.method in METHOD_LABELS else 'other'
+        observe('coderbank_view_duration_seconds', elapsed, view=view, method=method)
+        observe('coderbank_view_db_queries', stats['queries'], view=view)
+        observe('coderbank_view_db_duration_seconds', stats['seconds'], view=view)
+        return response
@@ -0,0 +1,135 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .metrics import record_shared
+from .models import OutboxEmail
+
+
+def get_outbox_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def render_email(template_name, context):
+    # The cached template loader compiles each template once per process.
+    return get_template(template_name).render(context)
+
+
+def queue_email(subject, message, to, html_message=None):
+    """Store an email in the outbox; it is sent later by the send_outbox command.
+
+    Call it inside the same atomic block as the balance change so the email is
+    only queued if the money movement commits.
+    """
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=message,
+        html_body=html_message or '',
+        to=to,
+    )
+
+
+def queue_emails(emails):
+    """Bulk version of ``queue_email`` for ``(subject, message, to, html_message)`` tuples."""
+    return OutboxEmail.objects.bulk_create(
+        OutboxEmail(subject=subject, body=message, html_body=html_message or '', to=to)
+        for subject, message, to, html_message in emails
+    )
+
+
+def retry_delay(attempts):
+    base = get_outbox_setting('OUTBOX_RETRY_BACKOFF', 30)
+    cap = get_outbox_setting('OUTBOX_RETRY_BACKOFF_MAX', 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap))
+
+
+def record_failure(email, error, now):
+    email.attempts += 1
+    email.last_error = error
+    if email.attempts >= get_outbox_setting('OUTBOX_MAX_ATTEMPTS', 5):
+        email.status = OutboxEmail.DEAD
+    else:
+        email.next_attempt_at = now + retry_delay(email.attempts)
+
+
+def claim_batch(batch_size, now):
+    """Lease a batch of due emails to this sender and commit.
+
+    Leased emails are not due again until ``OUTBOX_LEASE`` seconds have
+    passed, so another sender only picks them up if this one died.
+    """
+    lease = timedelta(seconds=get_outbox_setting('OUTBOX_LEASE', 600))
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        OutboxEmail.objects.filter(pk__in=[email.pk for email in batch]).update(next_attempt_at=now + lease)
+    return batch
+
+
+def drain_outbox(batch_size=None):
+    """Send one batch of due emails, over a single SMTP connection while it works.
+
+    The batch is claimed and the results recorded in two short transactions,
+    so no database transaction is held open while talking to the SMTP server.
+    The connection is reopened after a failed send. Returns a ``(sent,
+    failed)`` tuple. Failed emails are retried with exponential backoff and
+    dead-lettered after ``OUTBOX_MAX_ATTEMPTS``.
+    """
+    batch_size = batch_size or get_outbox_setting('OUTBOX_BATCH_SIZE', 100)
+    now = timezone.now()
+    sent = failed = 0
+    durations = []
+
+    batch = claim_batch(batch_size, now)
+    if not batch:
+        return sent, failed
+
+    connection = None
+    for index, email in enumerate(batch):
+        if connection is None:
+            connection = get_connection(fail_silently=False)
+            try:
+                connection.open()
+            except Exception as exc:
+                for unsent in batch[index:]:
+                    record_failure(unsent, f'connection failed: {exc}', now)
+                failed += len(batch) - index
+                break
+        message = EmailMultiAlternatives(email.subject, email.body, to=[email.to], connection=connection)
+        if email.html_body:
+            message.attach_alternative(email.html_body, 'text/html')
+        started = time.perf_counter()
+        try:
+            message.send()
+        except Exception as exc:
+            durations.append(time.perf_counter() - started)
+            record_failure(email, str(exc), now)
+            failed += 1
+            # The session may be unusable; don't charge the rest of the batch for it.
+            connection.close()
+            connection = None
+        else:
+            durations.append(time.perf_counter() - started)
+            email.attempts += 1
+            email.status = OutboxEmail.SENT
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            sent += 1
+    if connection is not None:
+        connection.close()
+
+    with transaction.atomic():
+        OutboxEmail.objects.bulk_update(
+            batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+        )
+    # send_outbox runs outside the web processes, so its timings go to the database.
+    record_shared('coderbank_smtp_send_duration_seconds', durations)
+    return sent, failed
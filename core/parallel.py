@@ -0,0 +1,46 @@
+"""Process pool helpers for the batch management commands."""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.db import connections
+
+
+def init_worker():
+    # Spawned workers start with a fresh interpreter; forked ones already
+    # have the app registry but must open their own DB connections.
+    if not apps.ready:
+        django.setup()
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def id_ranges(queryset, size):
+    """Split ``queryset`` into ``[(low, high), ...]`` half-open primary key ranges."""
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    first, last = pks.first(), pks.last()
+    if first is None:
+        return []
+    return [(low, low + size) for low in range(first, last + 1, size)]
+
+
+def run_in_pool(func, tasks, workers):
+    """Yield ``func(*task)`` for every task, in a process pool when ``workers > 1``.
+
+    Results are yielded in task order. With one worker everything runs
+    in this process, which keeps test databases and debuggers working.
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield func(*task)
+        return
+
+    # Children must not share the parent's DB sockets.
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        futures = [pool.submit(func, *task) for task in tasks]
+        for future in futures:
+            yield future.result()
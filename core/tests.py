@@ -1,3 +1,233 @@
-from django.test import TestCase
+import socketserver
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from transactions.posting import approve_loan, request_loan
+from coder_bank.routers import PIN_SESSION_KEY
+from . import metrics
+from .models import OutboxEmail
+from .outbox import claim_batch, drain_outbox, queue_email
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Tiny local SMTP server that records delivered messages."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, reject=()):
+        self.messages = []
+        self.connections = 0
+        self.reject = set(reject)
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost ready')
+        rcpt = None
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif command == 'RCPT':
+                rcpt = line.split(':', 1)[1].strip('<> ')
+                if rcpt in self.server.reject:
+                    self.reply('550 mailbox unavailable')
+                else:
+                    self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 end with .')
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b'.\r\n', b''):
+                        break
+                    data.append(chunk)
+                self.server.messages.append((rcpt, b''.join(data)))
+                self.reply('250 queued')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.smtp = SMTPStandIn(reject={'bounce@example.com'})
+        thread = threading.Thread(target=self.smtp.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+        settings_override = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.smtp.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            OUTBOX_MAX_ATTEMPTS=2,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_batch_is_sent_over_one_connection(self):
+        for i in range(5):
+            queue_email('Deposite Message', f'<p>{i}</p>', f'user{i}@example.com', html_message=f'<p>{i}</p>')
+
+        self.assertEqual(drain_outbox(), (5, 0))
+        self.assertEqual(len(self.smtp.messages), 5)
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists())
+
+    def test_connection_is_reopened_after_a_failed_send(self):
+        queue_email('Deposite Message', 'hello', 'user0@example.com')
+        bounced = queue_email('Loan Message', 'hello', 'bounce@example.com')
+        queue_email('Deposite Message', 'hello', 'user1@example.com')
+
+        self.assertEqual(drain_outbox(), (2, 1))
+        self.assertEqual([rcpt for rcpt, _ in self.smtp.messages], ['user0@example.com', 'user1@example.com'])
+        self.assertEqual(self.smtp.connections, 2)
+        bounced.refresh_from_db()
+        self.assertEqual((bounced.status, bounced.attempts), (OutboxEmail.PENDING, 1))
+
+    def test_claimed_emails_are_leased(self):
+        email = queue_email('Deposite Message', 'hello', 'user0@example.com')
+        claim_batch(10, timezone.now())
+        email.refresh_from_db()
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=60))
+        self.assertEqual(drain_outbox(), (0, 0))
+
+    def test_failures_back_off_then_dead_letter(self):
+        email = queue_email('Loan Message', 'hello', 'bounce@example.com')
+
+        self.assertEqual(drain_outbox(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(drain_outbox(), (0, 0))
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(drain_outbox(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.DEAD)
+        self.assertIn('550', email.last_error)
+
+
+@skipUnless('replica' in settings.DATABASES, 'needs a replica database alias')
+@override_settings(REPLICA_DATABASE_ALIAS='replica')
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        # Give the replica a stale copy of the account so reads can be told apart.
+        self.user = User.objects.create_user('reader', password='pass12345')
+        self.account = UserBankAccount.objects.create(
+            user=self.user, account_type='Savings', gender='Male', account_no=1000001, balance=Decimal('100')
+        )
+        User.objects.using('replica').bulk_create([User(pk=self.user.pk, username='reader', password=self.user.password)])
+        UserBankAccount.objects.using('replica').bulk_create([UserBankAccount(
+            pk=self.account.pk, user_id=self.user.pk, account_type='Savings', gender='Male',
+            account_no=1000001, balance=Decimal('1'),
+        )])
+        self.client.force_login(self.user)
+
+    def test_read_only_views_use_the_replica_until_the_user_writes(self):
+        self.assertEqual(self.client.get(reverse('api_balance')).json()['balance'], '1.00')
+
+        self.client.post(reverse('deposit_money'), {'amount': '500'})
+        self.assertEqual(self.client.get(reverse('api_balance')).json()['balance'], '600.00')
+
+        session = self.client.session
+        session[PIN_SESSION_KEY] = 0
+        session.save()
+        self.assertEqual(self.client.get(reverse('api_balance')).json()['balance'], '1.00')
+
+    def test_writes_made_by_a_get_pin_the_user_to_the_primary(self):
+        loan = approve_loan(request_loan(self.account, Decimal('50')))
+        session = self.client.session
+        session[PIN_SESSION_KEY] = 0
+        session.save()
+
+        self.client.get(reverse('loan_pay', args=[loan.pk]))
+        self.assertGreater(self.client.session[PIN_SESSION_KEY], time.time())
+        self.assertEqual(self.client.get(reverse('api_balance')).json()['balance'], '100.00')
+
+    def test_views_without_opt_in_read_the_primary(self):
+        response = self.client.get(reverse('deposit_money'))
+        self.assertEqual(response.context['form'].account.balance, Decimal('100'))
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_shards_from_every_thread_are_merged(self):
+        def record():
+            for _ in range(100):
+                metrics.observe('coderbank_view_db_queries', 3, view='transfer')
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counts, total = metrics.collect()[('coderbank_view_db_queries', (('view', 'transfer'),))]
+        self.assertEqual(sum(counts), 400)
+        self.assertEqual(total, 1200)
+
+    def test_retired_threads_do_not_grow_the_shard_list(self):
+        for _ in range(50):
+            thread = threading.Thread(target=metrics.observe, args=('coderbank_view_db_queries', 1), kwargs={'view': 'home'})
+            thread.start()
+            thread.join()
+        metrics.observe('coderbank_view_db_queries', 1, view='home')
+
+        self.assertLessEqual(len(metrics._shards), 2)
+        self.assertEqual(sum(metrics.collect()[('coderbank_view_db_queries', (('view', 'home'),))][0]), 51)
+
+    def test_smtp_timings_from_the_sender_process_are_served(self):
+        queue_email('Hello', 'Body', 'to@example.com')
+        drain_outbox()
+        metrics.reset()
+
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('coderbank_smtp_send_duration_seconds_count 1', body)
+
+    def test_requests_are_recorded_by_url_name(self):
+        self.client.get(reverse('home'))
+        response = self.client.get(reverse('metrics'))
+        body = response.content.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('coderbank_view_duration_seconds_count{method="GET",view="home"} 1', body)
+        self.assertIn('coderbank_view_db_queries_bucket{view="home",le="+Inf"} 1', body)
+
+    def test_unknown_methods_share_one_series(self):
+        self.client.generic('FOO', reverse('home'))
+        self.client.generic('BAR', reverse('home'))
+        series = [labels for name, labels in metrics.collect() if name == 'coderbank_view_duration_seconds']
+        self.assertEqual(series, [(('method', 'other'), ('view', 'home'))])
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
@@ -1,21 +1,125 @@
-from django.contrib import admin
-from .models import Transaction, Bank
-from .views import send_transaction_email
+from django import forms
+from django.contrib import admin, messages
+from django.http import HttpResponseRedirect
+from .models import ArchiveSegment, Transaction, Bank
+from .constants import LOAN, LOAN_PAID, MAX_ACTIVE_LOANS
+from .views import render_transaction_email
+from .posting import LoanLimitExceeded, approve_loans, request_loan
+from core.outbox import queue_emails
+from core.paginator import EstimatedCountPaginator
+from accounts.admin import AccountSearchMixin
 # Register your models here.
+def queue_loan_approval_emails(loans):
+    emails = []
+    for loan in loans:
+        user = loan.account.user
+        message = render_transaction_email(user, loan.amount, "transactions/admin_email.html")
+        emails.append(("Loan Approval", message, user.email, message))
+    queue_emails(emails)
+
+class TransactionAdminForm(forms.ModelForm):
+    class Meta:
+        model = Transaction
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        account = cleaned_data.get('account')
+        if (
+            self.instance.pk is None and account is not None
+            and cleaned_data.get('transaction_type') == LOAN
+            and account.active_loan_count >= MAX_ACTIVE_LOANS
+        ):
+            raise forms.ValidationError('This account has crossed its loan limit.')
+        return cleaned_data
+
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
-    list_display = ['account', 'amount', 'balance_after_transaction', 'transaction_type', 'loan_approve']
+class TransactionAdmin(AccountSearchMixin, admin.ModelAdmin):
+    form = TransactionAdminForm
+    list_display = ['account', 'amount', 'balance_after_transaction', 'transaction_type', 'loan_approve', 'timestamp']
+    list_select_related = ['account']
+    list_filter = ['transaction_type', 'loan_approve']
+    date_hierarchy = 'timestamp'
+    search_fields = ['account__account_no']
+    search_prefix = 'account__'
+    raw_id_fields = ['account']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['approve_selected_loans']
     
+    def get_readonly_fields(self, request, obj=None):
+        readonly = list(super().get_readonly_fields(request, obj))
+        if obj is None:
+            return readonly
+        # Balances and loan counters follow these; a row can't become or stop being a loan.
+        readonly += ['account', 'transaction_type']
+        if obj.transaction_type in (LOAN, LOAN_PAID):
+            # The principal and rollups follow the amount; credited loans are
+            # changed by pay_loan() only.
+            readonly.append('amount')
+            if obj.loan_approve or obj.transaction_type == LOAN_PAID:
+                readonly.append('loan_approve')
+        return readonly
+
     def save_model(self, request, obj, form, change):
-        if obj.loan_approve == True:
-            obj.account.balance += obj.amount
-            obj.balance_after_transaction = obj.account.balance
-            obj.account.save()
-            send_transaction_email(obj.account.user, obj.amount, "Loan Approval", "transactions/admin_email.html")
-        super().save_model(request, obj, form, change)
+        if obj.transaction_type != LOAN:
+            return super().save_model(request, obj, form, change)
+        approving = obj.loan_approve
+        if change:
+            # Store the loan as it is in the database; approve_loans() flips
+            # the flag and credits the account only if it wasn't approved yet.
+            obj.loan_approve = Transaction.objects.filter(pk=obj.pk, loan_approve=True).exists()
+            super().save_model(request, obj, form, change)
+        else:
+            # Recorded like a customer's request, so it is counted as pending.
+            # The form checked the limit without a lock; another admin may
+            # have used it up since.
+            try:
+                loan = request_loan(obj.account, obj.amount)
+            except LoanLimitExceeded:
+                self.message_user(request, 'This account has crossed its loan limit.', messages.ERROR)
+                return
+            obj.pk, obj.timestamp, obj.balance_after_transaction = loan.pk, loan.timestamp, loan.balance_after_transaction
+            obj.loan_approve = False
+        if approving and not obj.loan_approve:
+            approved = approve_loans([obj.pk])
+            obj.loan_approve = True
+            if approved:
+                obj.balance_after_transaction = approved[0].balance_after_transaction
+                queue_loan_approval_emails(approved)
+
+    def log_addition(self, request, obj, message):
+        if obj.pk is not None:
+            return super().log_addition(request, obj, message)
+
+    def response_add(self, request, obj, post_url_continue=None):
+        if obj.pk is None:
+            # save_model() refused the loan and said why.
+            return HttpResponseRedirect(request.path)
+        return super().response_add(request, obj, post_url_continue)
+
+    @admin.action(description='Approve selected loans')
+    def approve_selected_loans(self, request, queryset):
+        approved = approve_loans(queryset.filter(transaction_type=LOAN, loan_approve=False).values_list('pk', flat=True))
+        queue_loan_approval_emails(approved)
+        self.message_user(request, f'Approved {len(approved)} loans.', messages.SUCCESS)
 
 @admin.register(Bank)
 class BankAdmin(admin.ModelAdmin):
     list_display = ('bankrupt',)
     list_editable = ('bankrupt',)
-    list_display_links = None
\ No newline at end of file
+    list_display_links = None
+
+@admin.register(ArchiveSegment)
+class ArchiveSegmentAdmin(AccountSearchMixin, admin.ModelAdmin):
+    list_display = ['account', 'month', 'row_count', 'net_total', 'path']
+    list_select_related = ['account']
+    date_hierarchy = 'month'
+    search_fields = ['account__account_no']
+    search_prefix = 'account__'
+    raw_id_fields = ['account']
+    # Segments mirror files on disk; only archive_transactions writes them.
+    readonly_fields = ['account', 'month', 'root', 'path', 'row_count', 'first_timestamp', 'last_timestamp', 'net_total', 'totals', 'sha256']
+
+    def has_add_permission(self, request):
+        return False
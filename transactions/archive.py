@@ -0,0 +1,286 @@
+"""Cold storage for aged transactions, written by ``manage.py archive_transactions``.
+
+Whole account-months older than the cutoff are moved out of the
+``Transaction`` table into one gzipped JSON lines file each::
+
+    <TRANSACTION_ARCHIVE_ROOT>/<account_id % 1000>/<account_id>/<YYYY-MM>.jsonl.gz
+
+with an ``ArchiveSegment`` row as the index entry (row count, first and last
+timestamp, net balance effect and per-type totals). The file is written
+before the rows are deleted, in the same database transaction that records
+the segment, so a crash in between leaves the rows in the table and the next
+run merges them into the existing file by id.
+
+Only rows whose history is final are archived. LOAN rows stay in the table:
+pending and approved loans are still listed, counted and paid from it.
+The archived days' ``BalanceCheckpoint`` rows are filled in by the same
+transaction, so historical balances never need the archived rows.
+
+Reads go through ``ArchiveReader``, which only opens the segments of months
+a requested date range reaches.
+"""
+import gzip
+import hashlib
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from .constants import DEPOSIT, WITHDRAWAL, LOAN_PAID, TRANSFER, INTEREST
+from .filters import day_start
+from .ledger import BALANCE_SOURCE_TYPES, signed_delta
+from .models import ArchiveSegment, BalanceCheckpoint, Transaction
+
+ARCHIVABLE_TYPES = (DEPOSIT, WITHDRAWAL, TRANSFER, LOAN_PAID, INTEREST)
+FIELDS = ('id', 'timestamp', 'transaction_type', 'amount', 'balance_after_transaction', 'loan_approve')
+
+
+def archive_root():
+    return str(getattr(settings, 'TRANSACTION_ARCHIVE_ROOT', os.path.join(settings.BASE_DIR, 'archive')))
+
+
+def segment_file(segment):
+    """Absolute path of ``segment``'s file."""
+    return os.path.join(segment.root or archive_root(), segment.path)
+
+
+def segment_path(account_id, month):
+    """Path of an account-month segment, relative to the archive root."""
+    return os.path.join(f'{account_id % 1000:03d}', str(account_id), f'{month:%Y-%m}.jsonl.gz')
+
+
+def month_of(timestamp):
+    return timezone.localtime(timestamp).date().replace(day=1)
+
+
+def row_key(row):
+    return row.timestamp, row.pk
+
+
+def encode_row(row):
+    pk, timestamp, transaction_type, amount, balance, loan_approve = row
+    return json.dumps({
+        'id': pk,
+        'timestamp': timestamp.isoformat(),
+        'transaction_type': transaction_type,
+        'amount': str(amount),
+        'balance_after_transaction': str(balance),
+        'loan_approve': loan_approve,
+    })
+
+
+def decode_row(line):
+    data = json.loads(line)
+    return (
+        data['id'],
+        datetime.fromisoformat(data['timestamp']),
+        data['transaction_type'],
+        Decimal(data['amount']),
+        Decimal(data['balance_after_transaction']),
+        data['loan_approve'],
+    )
+
+
+def read_segment_file(path):
+    """Rows of a segment file as ``FIELDS`` tuples, in ``(timestamp, id)`` order."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [decode_row(line) for line in f if line.strip()]
+
+
+def write_segment_file(path, rows):
+    """Atomically replace ``path`` with ``rows``; returns the sha256 of the compressed file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp'
+    # mtime=0 keeps the output, and so the checksum, a function of the rows.
+    with open(tmp, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+        for row in rows:
+            f.write(encode_row(row).encode('utf-8') + b'\n')
+    digest = hashlib.sha256()
+    with open(tmp, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    os.replace(tmp, path)
+    return digest.hexdigest()
+
+
+def read_segment(segment):
+    """Archived rows of ``segment`` as unsaved ``Transaction`` instances, oldest first."""
+    return [
+        Transaction(
+            pk=pk, account_id=segment.account_id, timestamp=timestamp, transaction_type=transaction_type,
+            amount=amount, balance_after_transaction=balance, loan_approve=loan_approve,
+        )
+        for pk, timestamp, transaction_type, amount, balance, loan_approve
+        in read_segment_file(segment_file(segment))
+    ]
+
+
+class ArchiveReader:
+    """Archived transactions of one account between two optional dates (inclusive).
+
+    Creating a reader costs one indexed query on ``ArchiveSegment``; segment
+    files are only opened while ``rows()`` is consumed, so a page that is
+    filled from the table never touches them.
+    """
+
+    def __init__(self, account, start_date=None, end_date=None, using=None):
+        segments = ArchiveSegment.objects.using(using).filter(account=account)
+        if start_date:
+            segments = segments.filter(month__gte=start_date.replace(day=1))
+        if end_date:
+            segments = segments.filter(month__lte=end_date)
+        self.segments = list(segments.order_by('month'))
+        self.start = day_start(start_date) if start_date else None
+        self.end = day_start(end_date + timedelta(days=1)) if end_date else None
+
+    def __bool__(self):
+        return bool(self.segments)
+
+    def in_range(self, row):
+        return (self.start is None or row.timestamp >= self.start) and (self.end is None or row.timestamp < self.end)
+
+    def rows(self, after=None, before=None):
+        """Rows after the ``(timestamp, pk)`` cursor ``after`` in ascending order,
+        or before ``before`` in descending order."""
+        if before is not None:
+            for segment in reversed(self.segments):
+                if segment.first_timestamp > before[0]:
+                    continue
+                for row in reversed(read_segment(segment)):
+                    if row_key(row) < before and self.in_range(row):
+                        yield row
+            return
+        for segment in self.segments:
+            if after is not None and segment.last_timestamp < after[0]:
+                continue
+            for row in read_segment(segment):
+                if (after is None or row_key(row) > after) and self.in_range(row):
+                    yield row
+
+
+def archived_rows_for_month(low, high, month):
+    """``{account_id: [FIELDS tuples]}`` of the archived rows of ``month`` for accounts ``low <= id < high``."""
+    segments = ArchiveSegment.objects.filter(account_id__gte=low, account_id__lt=high, month=month)
+    return {segment.account_id: read_segment_file(segment_file(segment)) for segment in segments}
+
+
+def summarize(rows):
+    net_total = Decimal('0')
+    totals = defaultdict(lambda: [0, Decimal('0')])
+    for _, _, transaction_type, amount, _, loan_approve in rows:
+        net_total += signed_delta(transaction_type, amount, loan_approve)
+        totals[transaction_type][0] += 1
+        totals[transaction_type][1] += amount
+    return net_total, {str(key): [count, str(total)] for key, (count, total) in totals.items()}
+
+
+def daily_checkpoints(account_id, rows):
+    """``BalanceCheckpoint`` rows for the days of ``rows`` with a balance-changing transaction."""
+    checkpoints = []
+    balance_rows = [row for row in rows if row[2] in BALANCE_SOURCE_TYPES]
+    for day, day_rows in groupby(balance_rows, key=lambda row: timezone.localtime(row[1]).date()):
+        day_rows = list(day_rows)
+        _, _, transaction_type, amount, balance, loan_approve = day_rows[0]
+        checkpoints.append(BalanceCheckpoint(
+            account_id=account_id,
+            day=day,
+            opening_balance=balance - signed_delta(transaction_type, amount, loan_approve),
+            closing_balance=day_rows[-1][4],
+        ))
+    return checkpoints
+
+
+def archive_accounts(account_ids, cutoff, root):
+    """Archive the rows of ``account_ids`` older than ``cutoff``, the first day of a month.
+
+    ``root`` is recorded on each segment unless it is TRANSACTION_ARCHIVE_ROOT,
+    so readers find files written elsewhere with ``--output``. Returns the
+    number of segments written and of rows archived.
+    """
+    rows = list(
+        Transaction.objects.filter(
+            account_id__in=account_ids, transaction_type__in=ARCHIVABLE_TYPES, timestamp__lt=day_start(cutoff),
+        )
+        .order_by('account_id', 'timestamp', 'pk')
+        .values_list(*FIELDS[:1], 'account_id', *FIELDS[1:])
+    )
+    if not rows:
+        return 0, 0
+    existing = {
+        (segment.account_id, segment.month): segment
+        for segment in ArchiveSegment.objects.filter(account_id__in=account_ids)
+    }
+    stored_root = '' if root == os.path.abspath(archive_root()) else root
+
+    segments = []
+    moved = []
+    checkpoints = []
+    archived_ids = []
+    for (account_id, month), group in groupby(rows, key=lambda row: (row[1], month_of(row[2]))):
+        group = [(pk, *rest) for pk, _, *rest in group]
+        archived_ids.extend(row[0] for row in group)
+        path = segment_path(account_id, month)
+        absolute = os.path.join(root, path)
+        if (account_id, month) in existing:
+            # Late rows for a month archived before. The file may also hold rows
+            # of a run that crashed before committing; merging by id drops those.
+            previous = segment_file(existing[account_id, month])
+            if previous != absolute:
+                moved.append(previous)
+            merged = {row[0]: row for row in read_segment_file(previous)}
+            merged.update((row[0], row) for row in group)
+            group = sorted(merged.values(), key=lambda row: (row[1], row[0]))
+        net_total, totals = summarize(group)
+        segments.append(ArchiveSegment(
+            account_id=account_id,
+            month=month,
+            root=stored_root,
+            path=path,
+            row_count=len(group),
+            first_timestamp=group[0][1],
+            last_timestamp=group[-1][1],
+            net_total=net_total,
+            totals=totals,
+            sha256=write_segment_file(absolute, group),
+        ))
+        checkpoints.extend(daily_checkpoints(account_id, group))
+
+    with transaction.atomic():
+        ArchiveSegment.objects.bulk_create(
+            segments,
+            update_conflicts=True,
+            unique_fields=['account', 'month'],
+            update_fields=['root', 'path', 'row_count', 'first_timestamp', 'last_timestamp', 'net_total', 'totals', 'sha256', 'updated_at'],
+        )
+        # Days that already have a checkpoint were recorded by the posting itself.
+        BalanceCheckpoint.objects.bulk_create(checkpoints, ignore_conflicts=True, batch_size=1000)
+        for offset in range(0, len(archived_ids), 1000):
+            Transaction.objects.filter(pk__in=archived_ids[offset:offset + 1000]).delete()
+    # Segments rewritten under another root no longer point at their old files.
+    for path in moved:
+        os.remove(path)
+    return len(segments), len(archived_ids)
+
+
+def archive_range(low, high, cutoff, root, batch_size=200):
+    """Archive accounts with ``low <= id < high``; runs inside a pool worker.
+
+    Accounts are processed ``batch_size`` at a time, each batch in its own
+    database transaction, so memory and lock time are bounded by the batch.
+    """
+    account_ids = list(
+        UserBankAccount.objects.filter(pk__gte=low, pk__lt=high).order_by('pk').values_list('pk', flat=True)
+    )
+    segments = rows = 0
+    for offset in range(0, len(account_ids), batch_size):
+        batch_segments, batch_rows = archive_accounts(account_ids[offset:offset + batch_size], cutoff, root)
+        segments += batch_segments
+        rows += batch_rows
+    return {'low': low, 'high': high, 'accounts': len(account_ids), 'segments': segments, 'rows': rows}
@@ -0,0 +1,62 @@
+"""Historical balance lookups backed by daily ``BalanceCheckpoint`` rows.
+
+Each posting upserts the checkpoint for the account's current day, so "what
+was the balance on day X" is at most two indexed single-row reads instead of
+a scan of the account's history.
+"""
+from datetime import timedelta
+
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import BalanceCheckpoint
+
+
+def record_balance_changes(changes, day=None):
+    """Upsert today's checkpoints from ``{account_id: (balance_before, balance_after)}``.
+
+    Must run inside the posting transaction, while the accounts are locked.
+    The opening balance is only written when the day's row is first created.
+    """
+    day = day or timezone.localdate()
+    BalanceCheckpoint.objects.bulk_create(
+        [
+            BalanceCheckpoint(account_id=account_id, day=day, opening_balance=before, closing_balance=after)
+            for account_id, (before, after) in changes.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['account', 'day'],
+        update_fields=['closing_balance'],
+    )
+
+
+def balance_as_of(account, day):
+    """Closing balance of ``account`` at the end of ``day``."""
+    checkpoints = BalanceCheckpoint.objects.filter(account=account)
+    closing = checkpoints.filter(day__lte=day).order_by('-day').values_list('closing_balance', flat=True).first()
+    if closing is not None:
+        return closing
+    # No activity up to that day: the balance is whatever the next day with
+    # activity opened with, or the current balance if there was none since.
+    opening = checkpoints.filter(day__gt=day).order_by('day').values_list('opening_balance', flat=True).first()
+    return account.balance if opening is None else opening
+
+
+def annotate_balance_as_of(queryset, day, name='balance_as_of'):
+    """Annotate an account queryset with ``balance_as_of(account, day)``, in the same query."""
+    checkpoints = BalanceCheckpoint.objects.filter(account=OuterRef('pk'))
+    return queryset.annotate(**{name: Coalesce(
+        Subquery(checkpoints.filter(day__lte=day).order_by('-day').values('closing_balance')[:1]),
+        Subquery(checkpoints.filter(day__gt=day).order_by('day').values('opening_balance')[:1]),
+        F('balance'),
+    )})
+
+
+def opening_balance(account, day):
+    """Balance of ``account`` at the start of ``day``."""
+    return balance_as_of(account, day - timedelta(days=1))
+
+
+def closing_balance(account, day):
+    return balance_as_of(account, day)
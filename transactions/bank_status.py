@@ -0,0 +1,37 @@
+"""Per-process cache of the ``Bank`` singleton's bankrupt flag.
+
+The flag is read on every withdrawal, loan request and transfer but changes
+almost never, so it is kept in memory for ``BANK_STATUS_CACHE_SECONDS``.
+Saves and deletes of ``Bank`` in this process invalidate it immediately (see
+``transactions.signals``); other processes pick the change up once their
+copy expires.
+"""
+import time
+
+from django.conf import settings
+
+from .models import Bank
+
+_cached = {'version': 0, 'bankrupt': None, 'expires_at': 0.0}
+
+
+def is_bank_bankrupt():
+    now = time.monotonic()
+    state = _cached
+    if state['bankrupt'] is not None and now < state['expires_at']:
+        return state['bankrupt']
+
+    version = state['version']
+    bank, created = Bank.objects.get_or_create(id=1)
+    if created:
+        # Creating the row fired our own invalidation signal.
+        version = _cached['version']
+    # Don't cache a value read before an invalidation that raced with us.
+    if version == _cached['version']:
+        ttl = getattr(settings, 'BANK_STATUS_CACHE_SECONDS', 30)
+        _cached.update(bankrupt=bank.bankrupt, expires_at=now + ttl)
+    return bank.bankrupt
+
+
+def invalidate_bank_status():
+    _cached.update(version=_cached['version'] + 1, bankrupt=None, expires_at=0.0)
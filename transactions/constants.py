@@ -3,6 +3,10 @@ WITHDRAWAL = 2
 LOAN = 3
 LOAN_PAID = 4
 TRANSFER = 5
+INTEREST = 6
+
+# Approved, unpaid loans an account may hold before new requests are refused.
+MAX_ACTIVE_LOANS = 2
 
 TRANSACTION_TYPE = (
     (DEPOSIT, 'Deposite'),
@@ -10,4 +14,18 @@ TRANSACTION_TYPE = (
     (LOAN, 'Loan'),
     (LOAN_PAID, 'Loan Paid'),
     (TRANSFER, 'Transfer'),
-)
\ No newline at end of file
+    (INTEREST, 'Interest'),
+)
+# Rollup-only type for the sender's leg of a transfer, so sent and received
+# money are totalled apart (TRANSFER buckets hold received transfers only).
+TRANSFER_SENT = -TRANSFER
+
+ROLLUP_TYPE = (
+    (DEPOSIT, 'Deposite'),
+    (WITHDRAWAL, 'Withdrawal'),
+    (LOAN, 'Loan'),
+    (LOAN_PAID, 'Loan Paid'),
+    (TRANSFER, 'Transfer Received'),
+    (TRANSFER_SENT, 'Transfer Sent'),
+    (INTEREST, 'Interest'),
+)
@@ -0,0 +1,54 @@
+"""Date range filtering for transaction queries.
+
+Dates are turned into half-open ``[start, end + 1 day)`` timestamp ranges in
+the current timezone, so the filter is a plain range on ``timestamp`` that the
+``(account, timestamp)`` index can serve. ``timestamp__date`` lookups wrap the
+column in a cast and force a scan of the account's history.
+"""
+import calendar
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_date_range(params):
+    """Read ``start_date``/``end_date`` (YYYY-MM-DD) from a QueryDict."""
+    return parse_date(params.get('start_date')), parse_date(params.get('end_date'))
+
+
+def day_start(day, tz=None):
+    """Aware datetime for midnight at the start of ``day``."""
+    return timezone.make_aware(datetime.combine(day, time.min), tz or timezone.get_current_timezone())
+
+
+def filter_date_range(queryset, start_date=None, end_date=None, field='timestamp'):
+    """Limit ``queryset`` to rows whose ``field`` falls on ``start_date``..``end_date`` inclusive."""
+    if start_date:
+        queryset = queryset.filter(**{f'{field}__gte': day_start(start_date)})
+    if end_date:
+        queryset = queryset.filter(**{f'{field}__lt': day_start(end_date + timedelta(days=1))})
+    return queryset
+
+
+def month_bounds(period):
+    """First and last day of the month containing ``period``."""
+    first = period.replace(day=1)
+    return first, first.replace(day=calendar.monthrange(first.year, first.month)[1])
+
+
+def previous_month(today):
+    """First day of the month before ``today``'s."""
+    return (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+
+def parse_period(value):
+    """``'2026-09'`` -> ``date(2026, 9, 1)``; raises ``ValueError`` otherwise."""
+    year, month = value.split('-')
+    return date(int(year), int(month), 1)
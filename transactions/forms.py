@@ -1,5 +1,6 @@
 from django import forms
-from .models import Transaction, UserBankAccount
+from accounts.directory import resolve_account
+from .models import Transaction
 
 class TransactionForm(forms.ModelForm):
     class Meta:
@@ -60,7 +61,7 @@ class LoanRequestForm(TransactionForm):  # Inherit from TransactionForm
         return amount
 
 class TransferForm(forms.Form):
-    account_number = forms.CharField(label='Account Number')
+    account_number = forms.IntegerField(label='Account Number', min_value=1)
     amount = forms.DecimalField(label='Amount')
 
     def __init__(self, *args, **kwargs):
@@ -82,7 +83,9 @@ class TransferForm(forms.Form):
         cleaned_data = super().clean()
         recipient_account_number = cleaned_data.get('account_number')
         amount = cleaned_data.get('amount')
-        recipient_account = UserBankAccount.objects.filter(account_no=recipient_account_number).first()
+        if recipient_account_number is None or amount is None:
+            return cleaned_data
+        recipient_account = resolve_account(recipient_account_number)
         if recipient_account is None:
             raise forms.ValidationError("Recipient account not found!")
         
@@ -0,0 +1,122 @@
+"""Monthly interest accrual for Savings accounts.
+
+Interest is ``rate / 365`` of each day's closing balance (negative balances
+earn nothing), summed over the days of the period. Daily balances come from
+the ``BalanceCheckpoint`` rows, which are the per-day closing values of the
+``balance_after_transaction`` history: an account's balance on a day is the
+closing balance of its latest checkpoint on or before that day.
+
+Each shard of accounts is computed as one ``accounts x days`` NumPy array of
+integer cents, so memory is bounded by the shard size rather than by the
+number of accounts. The credits are posted through ``post_entries`` (one
+set-based balance update and one ``bulk_create``) together with an
+``InterestAccrual`` row per account, whose unique ``(account, period)``
+constraint makes a re-run for the same period a no-op.
+"""
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+from django.db import transaction
+
+from accounts.models import UserBankAccount
+from .balances import annotate_balance_as_of
+from .constants import INTEREST
+from .filters import month_bounds
+from .models import BalanceCheckpoint, InterestAccrual
+from .posting import post_entries
+from .reconcile import CENTS
+
+DAYS_IN_YEAR = 365
+
+
+def savings_accounts():
+    return UserBankAccount.objects.filter(account_type='Savings')
+
+
+def opening_balances(low, high, start):
+    """``(account_ids, opening_cents)`` arrays for Savings accounts with ``low <= id < high``."""
+    rows = (
+        annotate_balance_as_of(savings_accounts().filter(pk__gte=low, pk__lt=high), start - timedelta(days=1), 'opening')
+        .order_by('pk')
+        .values_list('pk', 'opening')
+    )
+    ids = []
+    cents = []
+    for pk, opening in rows:
+        ids.append(pk)
+        cents.append(int(opening * 100))
+    return np.array(ids, dtype=np.int64), np.array(cents, dtype=np.int64)
+
+
+def daily_balances(account_ids, opening, low, high, start, end):
+    """``len(account_ids) x days`` array of each account's closing balance per day, in cents."""
+    days = (end - start).days + 1
+    values = np.zeros((len(account_ids), days + 1), dtype=np.int64)
+    known = np.zeros((len(account_ids), days + 1), dtype=bool)
+    # Column 0 is the balance before the period starts.
+    values[:, 0] = opening
+    known[:, 0] = True
+
+    rows = list(
+        BalanceCheckpoint.objects.filter(account_id__gte=low, account_id__lt=high, day__gte=start, day__lte=end)
+        .values_list('account_id', 'day', 'closing_balance')
+    )
+    if rows and len(account_ids):
+        checkpoint_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        columns = np.fromiter(((row[1] - start).days + 1 for row in rows), dtype=np.int64, count=len(rows))
+        closing = np.fromiter((int(row[2] * 100) for row in rows), dtype=np.int64, count=len(rows))
+        positions = np.searchsorted(account_ids, checkpoint_ids)
+        positions[positions == len(account_ids)] = 0
+        # Checkpoints of Current accounts in the same id range are dropped here.
+        savings = account_ids[positions] == checkpoint_ids
+        values[positions[savings], columns[savings]] = closing[savings]
+        known[positions[savings], columns[savings]] = True
+
+    # Carry each known balance forward over the days without activity.
+    latest = np.where(known, np.arange(days + 1), 0)
+    np.maximum.accumulate(latest, axis=1, out=latest)
+    return np.take_along_axis(values, latest, axis=1)[:, 1:]
+
+
+def interest_for(balance_days_cents, rate):
+    """Interest in BDT on ``balance_days_cents`` (sum of daily balances, in cents)."""
+    return (Decimal(int(balance_days_cents)) * rate / (100 * DAYS_IN_YEAR)).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def accrue_interest_range(low, high, period, rate):
+    """Accrue and post interest for Savings accounts with ``low <= id < high``; runs inside a pool worker."""
+    start, end = month_bounds(period)
+    account_ids, opening = opening_balances(low, high, start)
+    if not len(account_ids):
+        return {'accounts': 0, 'credited': 0, 'already_accrued': 0, 'total': Decimal('0')}
+
+    balance_days = np.clip(daily_balances(account_ids, opening, low, high, start, end), 0, None).sum(axis=1)
+    earning = np.nonzero(balance_days)[0]
+    amounts = {}
+    for index in earning:
+        amount = interest_for(balance_days[index], rate)
+        if amount > 0:
+            amounts[int(account_ids[index])] = amount
+
+    with transaction.atomic():
+        accrued = set(
+            InterestAccrual.objects.filter(period=start, account_id__in=list(amounts)).values_list('account_id', flat=True)
+        )
+        pending = [(pk, amount) for pk, amount in amounts.items() if pk not in accrued]
+        if pending:
+            rows = post_entries([
+                (UserBankAccount(pk=pk), amount, amount, INTEREST) for pk, amount in pending
+            ])
+            # A concurrent run for the same period fails here and rolls back.
+            InterestAccrual.objects.bulk_create(
+                InterestAccrual(account_id=pk, period=start, amount=amount, transaction=row)
+                for (pk, amount), row in zip(pending, rows)
+            )
+
+    return {
+        'accounts': len(account_ids),
+        'credited': len(pending),
+        'already_accrued': len(accrued),
+        'total': sum((amount for pk, amount in pending), Decimal('0')),
+    }
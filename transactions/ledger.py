@@ -0,0 +1,41 @@
+"""Sign conventions of ``Transaction.amount`` per transaction type.
+
+* DEPOSIT and WITHDRAWAL store a positive amount; withdrawals debit it.
+* TRANSFER stores the signed amount: negative for the sender's leg.
+* INTEREST stores the positive amount credited by ``accrue_interest``.
+* LOAN credits the amount once ``loan_approve`` is set; pending loans have no
+  effect on the balance.
+* LOAN_PAID rows are approved loans that were paid back: the credit and the
+  repayment cancel out.
+
+``balance_after_transaction`` is only a reliable point-in-time balance for
+the types in ``BALANCE_SOURCE_TYPES``; loan rows are stamped when they are
+approved or paid, not when they were created.
+"""
+from django.db.models import Case, DecimalField, F, Value, When
+
+from .constants import DEPOSIT, WITHDRAWAL, LOAN, LOAN_PAID, TRANSFER, INTEREST
+
+BALANCE_SOURCE_TYPES = (DEPOSIT, WITHDRAWAL, TRANSFER, INTEREST)
+
+
+def signed_delta(transaction_type, amount, loan_approve=False):
+    """Net effect a transaction row has had on its account balance."""
+    if transaction_type == WITHDRAWAL:
+        return -amount
+    if transaction_type == LOAN:
+        return amount if loan_approve else 0
+    if transaction_type == LOAN_PAID:
+        return 0
+    return amount
+
+
+def signed_amount():
+    """SQL expression for ``signed_delta`` of each row."""
+    return Case(
+        When(transaction_type=WITHDRAWAL, then=-F('amount')),
+        When(transaction_type=LOAN, loan_approve=True, then=F('amount')),
+        When(transaction_type__in=(LOAN, LOAN_PAID), then=Value(0)),
+        default=F('amount'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
@@ -0,0 +1,46 @@
+"""Rebuilding the loan counters kept on ``UserBankAccount``."""
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from accounts.models import UserBankAccount
+from .constants import LOAN
+from .models import Transaction
+
+
+def rebuild_loan_counters(low, high):
+    """Recompute loan counters for accounts with ``low <= id < high``.
+
+    The accounts are locked before the loans are counted, so a loan posted
+    meanwhile either waits for the rebuild or is already in the count.
+    Returns the number of accounts whose stored counters were wrong.
+    """
+    with transaction.atomic():
+        accounts = list(
+            UserBankAccount.objects.select_for_update()
+            .filter(pk__gte=low, pk__lt=high)
+            .only('active_loan_count', 'pending_loan_count', 'outstanding_loan_principal')
+        )
+        totals = {
+            row['account_id']: row
+            for row in (
+                Transaction.objects.filter(account_id__gte=low, account_id__lt=high, transaction_type=LOAN)
+                .order_by()
+                .values('account_id')
+                .annotate(
+                    active=Count('pk', filter=Q(loan_approve=True)),
+                    pending=Count('pk', filter=Q(loan_approve=False)),
+                    principal=Sum('amount', filter=Q(loan_approve=True)),
+                )
+            )
+        }
+        changed = []
+        for account in accounts:
+            row = totals.get(account.pk, {})
+            counters = (row.get('active', 0), row.get('pending', 0), row.get('principal') or 0)
+            if counters != (account.active_loan_count, account.pending_loan_count, account.outstanding_loan_principal):
+                account.active_loan_count, account.pending_loan_count, account.outstanding_loan_principal = counters
+                changed.append(account)
+        UserBankAccount.objects.bulk_update(
+            changed, ['active_loan_count', 'pending_loan_count', 'outstanding_loan_principal'], batch_size=1000
+        )
+    return len(changed)
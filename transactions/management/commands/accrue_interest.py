@@ -0,0 +1,55 @@
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.parallel import default_workers, id_ranges, run_in_pool
+from transactions.filters import month_bounds, parse_period, previous_month
+from transactions.interest import accrue_interest_range, savings_accounts
+
+
+class Command(BaseCommand):
+    help = (
+        'Credit Savings accounts with daily-balance-weighted interest for one month. '
+        'Accounts already credited for that month are skipped, so the command is safe to re-run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', help='Month to accrue, as YYYY-MM (default: last month).')
+        parser.add_argument('--rate', type=Decimal, help='Annual rate, e.g. 0.04 (default: SAVINGS_INTEREST_RATE).')
+        parser.add_argument('--workers', type=int, default=default_workers())
+        parser.add_argument('--shard-size', type=int, default=10000, help='Accounts per shard (by id range); bounds memory per worker.')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        try:
+            period = parse_period(options['period']) if options['period'] else previous_month(today)
+        except ValueError:
+            raise CommandError('--period must look like 2026-09.')
+        start, end = month_bounds(period)
+        if end >= today:
+            raise CommandError(f'{start:%Y-%m} has not ended yet.')
+        rate = options['rate'] if options['rate'] is not None else Decimal(str(getattr(settings, 'SAVINGS_INTEREST_RATE', '0.04')))
+        if rate < 0:
+            raise CommandError('The interest rate cannot be negative.')
+
+        shards = id_ranges(savings_accounts(), options['shard_size'])
+        started = time.perf_counter()
+        accounts = credited = already = 0
+        total = Decimal('0')
+        tasks = [(low, high, start, rate) for low, high in shards]
+        for result in run_in_pool(accrue_interest_range, tasks, options['workers']):
+            accounts += result['accounts']
+            credited += result['credited']
+            already += result['already_accrued']
+            total += result['total']
+        elapsed = time.perf_counter() - started
+
+        rate_per_sec = accounts / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{start:%Y-%m}: credited {total} BDT to {credited} of {accounts} Savings accounts '
+            f'({already} already accrued) in {len(shards)} shards in {elapsed:.2f}s '
+            f'({rate_per_sec:,.0f} accounts/sec).'
+        ))
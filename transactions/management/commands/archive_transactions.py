@@ -0,0 +1,70 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from core.parallel import default_workers, id_ranges, run_in_pool
+from transactions.archive import archive_range, archive_root
+from transactions.filters import parse_period
+
+
+def months_before(day, months):
+    """First day of the month ``months`` months before ``day``'s."""
+    index = day.year * 12 + day.month - 1 - months
+    return day.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Move transactions of whole months before the cutoff into compressed per-account, '
+        'per-month segment files under TRANSACTION_ARCHIVE_ROOT, in parallel by account id '
+        'range. Loan rows are kept. Safe to rerun; late rows are merged into existing segments.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            help='First month to keep, as YYYY-MM (default: TRANSACTION_ARCHIVE_AFTER_MONTHS months ago).',
+        )
+        parser.add_argument(
+            '--output', help='Archive root (default: TRANSACTION_ARCHIVE_ROOT); recorded on the segments written.',
+        )
+        parser.add_argument('--workers', type=int, default=default_workers())
+        parser.add_argument('--shard-size', type=int, default=5000, help='Accounts per shard (by id range).')
+        parser.add_argument('--batch-size', type=int, default=200, help='Accounts archived per database transaction.')
+
+    def handle(self, *args, **options):
+        this_month = timezone.localdate().replace(day=1)
+        if options['before']:
+            try:
+                cutoff = parse_period(options['before'])
+            except ValueError:
+                raise CommandError('--before must look like 2024-10.')
+            if cutoff > this_month:
+                raise CommandError('--before cannot be in the future; the current month is never archived.')
+        else:
+            cutoff = months_before(this_month, getattr(settings, 'TRANSACTION_ARCHIVE_AFTER_MONTHS', 24))
+        root = os.path.abspath(options['output'] or archive_root())
+
+        started = time.perf_counter()
+        segments = rows = 0
+        tasks = [
+            (low, high, cutoff, root, options['batch_size'])
+            for low, high in id_ranges(UserBankAccount.objects.all(), options['shard_size'])
+        ]
+        for result in run_in_pool(archive_range, tasks, options['workers']):
+            segments += result['segments']
+            rows += result['rows']
+            self.stdout.write(
+                f"Accounts {result['low']}-{result['high'] - 1}: {result['rows']} rows in {result['segments']} segments"
+            )
+        elapsed = time.perf_counter() - started
+
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {rows} transactions before {cutoff:%Y-%m} into {segments} segments under {root} '
+            f'in {elapsed:.2f}s ({rate:,.0f} rows/sec).'
+        ))
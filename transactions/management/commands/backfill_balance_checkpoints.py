@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from transactions.ledger import BALANCE_SOURCE_TYPES, signed_delta
+from transactions.models import BalanceCheckpoint, Transaction
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily balance checkpoints from the Transaction history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Accounts processed per batch.')
+
+    def handle(self, *args, **options):
+        account_ids = list(UserBankAccount.objects.order_by('pk').values_list('pk', flat=True))
+        written = 0
+        for offset in range(0, len(account_ids), options['chunk_size']):
+            chunk = account_ids[offset:offset + options['chunk_size']]
+            checkpoints = self.build_checkpoints(chunk)
+            with transaction.atomic():
+                BalanceCheckpoint.objects.bulk_create(
+                    checkpoints,
+                    batch_size=5000,
+                    update_conflicts=True,
+                    unique_fields=['account', 'day'],
+                    update_fields=['opening_balance', 'closing_balance'],
+                )
+            written += len(checkpoints)
+        self.stdout.write(f'Wrote {written} checkpoints for {len(account_ids)} accounts.')
+
+    def build_checkpoints(self, account_ids):
+        days = {}
+        last_closing = {}
+        rows = (
+            Transaction.objects.filter(account_id__in=account_ids, transaction_type__in=BALANCE_SOURCE_TYPES)
+            .order_by('account_id', 'timestamp', 'pk')
+            .values_list('account_id', 'timestamp', 'transaction_type', 'amount', 'balance_after_transaction')
+            .iterator(chunk_size=5000)
+        )
+        for account_id, timestamp, transaction_type, amount, balance_after in rows:
+            key = (account_id, timezone.localtime(timestamp).date())
+            if key not in days:
+                opening = last_closing.get(account_id, balance_after - signed_delta(transaction_type, amount))
+                days[key] = BalanceCheckpoint(
+                    account_id=account_id, day=key[1], opening_balance=opening, closing_balance=balance_after
+                )
+            days[key].closing_balance = balance_after
+            last_closing[account_id] = balance_after
+
+        # Loan approvals and repayments aren't dated by their rows; make sure
+        # the latest checkpoint agrees with the stored balance.
+        today = timezone.localdate()
+        balances = UserBankAccount.objects.filter(pk__in=last_closing).values_list('pk', 'balance')
+        for account_id, balance in balances:
+            if balance == last_closing[account_id]:
+                continue
+            key = (account_id, today)
+            if key in days:
+                days[key].closing_balance = balance
+            else:
+                days[key] = BalanceCheckpoint(
+                    account_id=account_id, day=today,
+                    opening_balance=last_closing[account_id], closing_balance=balance,
+                )
+        return list(days.values())
@@ -0,0 +1,178 @@
+import json
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts.forms import UserRegistrationForm
+from core.bench import percentile, scratch_database
+from transactions.posting import post_deposit
+
+FLOWS = ('deposit', 'withdraw', 'transfer', 'loan', 'report')
+DEFAULT_MIX = 'deposit=30,withdraw=20,transfer=25,loan=10,report=15'
+
+
+def parse_mix(value):
+    weights = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in FLOWS:
+            raise CommandError(f'Unknown flow {name!r}; choose from {", ".join(FLOWS)}.')
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Flow {name!r} needs a numeric weight, e.g. {name}=10.')
+    if not any(weights.values()):
+        raise CommandError('At least one flow needs a positive weight.')
+    return weights
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed users through the registration form on a scratch database, drive a mix of '
+        'banking flows through the test client from worker threads, and print throughput '
+        'and p50/p95/p99 latency per flow as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per thread.')
+        parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                            help=f'Comma-separated flow=weight pairs (default {DEFAULT_MIX}).')
+        parser.add_argument('--initial-balance', type=Decimal, default=Decimal('100000'))
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        if isinstance(options['mix'], str):
+            options['mix'] = parse_mix(options['mix'])
+        if options['users'] < 2:
+            raise CommandError('Transfers need at least two users.')
+        # Password hashing and SMTP are not what we are measuring.
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+            ALLOWED_HOSTS=['testserver'],
+            REPLICA_DATABASE_ALIAS=None,
+        ), scratch_database():
+            accounts = self.seed(options)
+            report = self.run(accounts, options)
+
+        payload = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(payload + '\n')
+        else:
+            self.stdout.write(payload)
+
+    def seed(self, options):
+        accounts = []
+        for i in range(options['users']):
+            form = UserRegistrationForm(data={
+                'username': f'bench{i}',
+                'password1': 'bench-Passw0rd!',
+                'password2': 'bench-Passw0rd!',
+                'first_name': 'Bench',
+                'last_name': str(i),
+                'email': f'bench{i}@example.com',
+                'account_type': 'Savings',
+                'birth_day': '1990-01-01',
+                'gender': 'Male',
+                'postal_code': 1000,
+                'street_address': 'Bench Street',
+                'city': 'Dhaka',
+                'country': 'Bangladesh',
+            })
+            if not form.is_valid():
+                raise CommandError(f'Could not register bench{i}: {form.errors.as_text()}')
+            user = form.save()
+            post_deposit(user.account, options['initial_balance'])
+            accounts.append(user.account)
+        return accounts
+
+    def build_request(self, flow, rng, account, accounts):
+        if flow == 'deposit':
+            return 'post', reverse('deposit_money'), {'amount': rng.randint(500, 5000)}
+        if flow == 'withdraw':
+            return 'post', reverse('withdraw_money'), {'amount': rng.randint(500, 2000)}
+        if flow == 'transfer':
+            recipient = rng.choice([other for other in accounts if other.pk != account.pk])
+            return 'post', reverse('transfer'), {
+                'account_number': recipient.account_no, 'amount': rng.randint(1, 500),
+            }
+        if flow == 'loan':
+            return 'post', reverse('loan_request'), {'amount': rng.randint(1000, 10000)}
+        return 'get', reverse('transaction_report'), None
+
+    def run(self, accounts, options):
+        flows = list(options['mix'])
+        weights = [options['mix'][flow] for flow in flows]
+        latencies = {flow: [] for flow in flows}
+        errors = {flow: 0 for flow in flows}
+        results_lock = threading.Lock()
+
+        # Log in up front so sessions are not created under load.
+        clients = []
+        for index in range(options['threads']):
+            client = Client(raise_request_exception=False)
+            client.force_login(accounts[index % len(accounts)].user)
+            clients.append(client)
+
+        def worker(index):
+            rng = random.Random(options['seed'] + index)
+            account = accounts[index % len(accounts)]
+            client = clients[index]
+            local_latencies = {flow: [] for flow in flows}
+            local_errors = {flow: 0 for flow in flows}
+            try:
+                for _ in range(options['requests']):
+                    flow = rng.choices(flows, weights)[0]
+                    method, url, data = self.build_request(flow, rng, account, accounts)
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, data)
+                    local_latencies[flow].append(time.perf_counter() - started)
+                    if response.status_code >= 400:
+                        local_errors[flow] += 1
+            finally:
+                connection.close()
+                with results_lock:
+                    for flow in flows:
+                        latencies[flow].extend(local_latencies[flow])
+                        errors[flow] += local_errors[flow]
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        report = {
+            'users': len(accounts),
+            'threads': options['threads'],
+            'elapsed_seconds': round(elapsed, 3),
+            'requests': sum(len(values) for values in latencies.values()),
+            'errors': sum(errors.values()),
+        }
+        report['throughput_rps'] = round(report['requests'] / elapsed, 1) if elapsed else 0.0
+        report['flows'] = {}
+        for flow in flows:
+            values = sorted(latencies[flow])
+            report['flows'][flow] = {
+                'requests': len(values),
+                'errors': errors[flow],
+                'throughput_rps': round(len(values) / elapsed, 1) if elapsed else 0.0,
+                'p50_ms': round(percentile(values, 50) * 1000, 2),
+                'p95_ms': round(percentile(values, 95) * 1000, 2),
+                'p99_ms': round(percentile(values, 99) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2) if values else 0.0,
+            }
+        return report
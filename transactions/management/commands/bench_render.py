@@ -0,0 +1,103 @@
+import copy
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts.models import UserBankAccount
+from core.bench import scratch_database
+from transactions.constants import TRANSACTION_TYPE
+from transactions.models import Transaction
+
+UNCACHED_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def uncached_templates():
+    templates = copy.deepcopy(settings.TEMPLATES)
+    for engine in templates:
+        engine.setdefault('OPTIONS', {})['loaders'] = UNCACHED_LOADERS
+    return templates
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure response time of the report, deposit and home pages with plain template '
+        'loaders and no fragment cache (before) against the configured cached loader and '
+        'fragment caching (after).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=5000, help='Rows seeded for the benchmark user.')
+        parser.add_argument('--page-size', type=int, default=500, help='Rows shown on the report page.')
+        parser.add_argument('--repeat', type=int, default=30)
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=['testserver'], REPLICA_DATABASE_ALIAS=None), scratch_database():
+            user = self.seed(options)
+            pages = {
+                'home': reverse('home'),
+                'deposit': reverse('deposit_money'),
+                'report': f"{reverse('transaction_report')}?page_size={options['page_size']}",
+            }
+            before = {
+                'TEMPLATES': uncached_templates(),
+                'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            }
+            after = {
+                'TEMPLATES': settings.TEMPLATES,
+                'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                # A single process, so locmem behaves like the shared cache here.
+                'BALANCE_CACHE_ENABLED': True,
+            }
+            results = {}
+            for label, overrides in (('before', before), ('after', after)):
+                with override_settings(**overrides):
+                    client = Client()
+                    client.force_login(user)
+                    results[label] = {name: self.measure(client, url, options['repeat']) for name, url in pages.items()}
+
+        self.stdout.write(f"{'page':<10}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+        for name in pages:
+            old, new = results['before'][name], results['after'][name]
+            self.stdout.write(f'{name:<10}{old:>12.2f}{new:>12.2f}{old / new:>9.2f}x')
+
+    def seed(self, options):
+        user = User.objects.create_user('bench', password='bench-Passw0rd!', first_name='Bench')
+        account = UserBankAccount.objects.create(
+            user=user, account_type='Savings', account_no=1000000 + user.pk, gender='Male',
+            balance=Decimal('100000'),
+        )
+        rng = random.Random(0)
+        types = [value for value, label in TRANSACTION_TYPE]
+        Transaction.objects.bulk_create(
+            (
+                Transaction(
+                    account=account,
+                    amount=Decimal(rng.randint(1, 5000)),
+                    balance_after_transaction=Decimal(rng.randint(0, 100000)),
+                    transaction_type=rng.choice(types),
+                )
+                for _ in range(options['transactions'])
+            ),
+            batch_size=2000,
+        )
+        return user
+
+    def measure(self, client, url, repeat):
+        client.get(url)  # warm up
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, (url, response.status_code)
+        return statistics.median(timings)
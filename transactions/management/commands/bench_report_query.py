@@ -0,0 +1,109 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from core.bench import scratch_database
+from transactions.constants import TRANSACTION_TYPE
+from transactions.filters import filter_date_range
+from transactions.models import Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a scratch database with a large Transaction table and compare the '
+        'report date filter before (timestamp__date, no composite index) and after.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2_000_000)
+        parser.add_argument('--accounts', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=730, help='Spread the rows over this many days.')
+        parser.add_argument('--range-days', type=int, default=30, help='Width of the filtered date range.')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.seed(options)
+            self.compare(options)
+
+    def seed(self, options):
+        User.objects.bulk_create(User(username=f'bench{i}') for i in range(options['accounts']))
+        UserBankAccount.objects.bulk_create(
+            UserBankAccount(user=user, account_type='Savings', account_no=1000000 + user.pk, gender='Male')
+            for user in User.objects.all()
+        )
+        account_ids = list(UserBankAccount.objects.values_list('pk', flat=True))
+        types = [value for value, label in TRANSACTION_TYPE]
+        ops = connection.ops
+        now = timezone.now()
+        rng = random.Random(0)
+        sql = (
+            f'INSERT INTO {Transaction._meta.db_table} '
+            '(account_id, amount, balance_after_transaction, transaction_type, timestamp, loan_approve) '
+            'VALUES (%s, %s, %s, %s, %s, %s)'
+        )
+        started = time.perf_counter()
+        for offset in range(0, options['rows'], options['batch_size']):
+            count = min(options['batch_size'], options['rows'] - offset)
+            params = [
+                (
+                    rng.choice(account_ids),
+                    ops.adapt_decimalfield_value(Decimal(rng.randint(1, 5000)), 12, 2),
+                    ops.adapt_decimalfield_value(Decimal(rng.randint(0, 100000)), 12, 2),
+                    rng.choice(types),
+                    ops.adapt_datetimefield_value(now - timedelta(seconds=rng.randint(0, options['days'] * 86400))),
+                    False,
+                )
+                for _ in range(count)
+            ]
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, params)
+        self.stdout.write(f"Seeded {options['rows']} transactions in {time.perf_counter() - started:.1f}s")
+        self.account_id = account_ids[len(account_ids) // 2]
+
+    def compare(self, options):
+        end_date = timezone.localdate()
+        start_date = end_date - timedelta(days=options['range_days'])
+        base = Transaction.objects.filter(account_id=self.account_id)
+
+        with connection.schema_editor() as editor:
+            for index in Transaction._meta.indexes:
+                editor.remove_index(Transaction, index)
+        self.analyze()
+        legacy = base.filter(timestamp__date__gte=start_date, timestamp__date__lte=end_date)
+        self.measure('before', legacy, options['repeat'])
+
+        with connection.schema_editor() as editor:
+            for index in Transaction._meta.indexes:
+                editor.add_index(Transaction, index)
+        self.analyze()
+        ranged = filter_date_range(base, start_date, end_date)
+        self.measure('after', ranged, options['repeat'])
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def measure(self, label, queryset, repeat):
+        queryset = queryset.order_by('timestamp', 'pk')
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = len(list(queryset.all()))
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{label}: {rows} rows'))
+        self.stdout.write(str(queryset.query))
+        self.stdout.write(queryset.explain())
+        self.stdout.write(
+            f'median {statistics.median(timings):.2f} ms, '
+            f'min {min(timings):.2f} ms, max {max(timings):.2f} ms over {repeat} runs'
+        )
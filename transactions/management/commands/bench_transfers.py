@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.db.models import Sum
+
+from accounts.models import UserBankAccount
+from core.bench import scratch_database
+from transactions.constants import TRANSFER
+from transactions.models import Transaction
+from transactions.posting import InsufficientFunds, post_transfer
+
+
+class Command(BaseCommand):
+    help = 'Stress the transfer posting engine from many threads and check that money is conserved.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=20)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--transfers', type=int, default=200, help='Transfers per thread.')
+        parser.add_argument('--initial-balance', type=Decimal, default=Decimal('10000'))
+        parser.add_argument('--max-retries', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.run(options)
+
+    def run(self, options):
+        User.objects.bulk_create(
+            User(username=f'bench{i}') for i in range(options['accounts'])
+        )
+        users = User.objects.filter(username__startswith='bench').order_by('pk')
+        UserBankAccount.objects.bulk_create(
+            UserBankAccount(
+                user=user, account_type='Savings', account_no=1000000 + user.pk,
+                gender='Male', balance=options['initial_balance'],
+            )
+            for user in users
+        )
+        account_ids = list(UserBankAccount.objects.values_list('pk', flat=True))
+        expected_total = options['initial_balance'] * len(account_ids)
+        stats = {'posted': 0, 'rejected': 0, 'retries': 0, 'failed': 0}
+        stats_lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            posted = rejected = retries = failed = 0
+            try:
+                for _ in range(options['transfers']):
+                    sender_id, recipient_id = rng.sample(account_ids, 2)
+                    amount = Decimal(rng.randint(1, 500))
+                    for _attempt in range(options['max_retries']):
+                        try:
+                            post_transfer(
+                                UserBankAccount(pk=sender_id),
+                                UserBankAccount(pk=recipient_id),
+                                amount,
+                            )
+                            posted += 1
+                        except InsufficientFunds:
+                            rejected += 1
+                        except OperationalError:
+                            # SQLite reports lock contention instead of waiting.
+                            retries += 1
+                            time.sleep(0.001)
+                            continue
+                        break
+                    else:
+                        failed += 1
+            finally:
+                connection.close()
+                with stats_lock:
+                    stats['posted'] += posted
+                    stats['rejected'] += rejected
+                    stats['retries'] += retries
+                    stats['failed'] += failed
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total = UserBankAccount.objects.aggregate(total=Sum('balance'))['total']
+        net_transfers = Transaction.objects.filter(transaction_type=TRANSFER).aggregate(total=Sum('amount'))['total'] or 0
+        negative = UserBankAccount.objects.filter(balance__lt=0).count()
+
+        self.stdout.write(
+            f"{stats['posted']} transfers posted, {stats['rejected']} rejected for funds, "
+            f"{stats['retries']} lock retries, {stats['failed']} gave up in {elapsed:.2f}s "
+            f"({stats['posted'] / elapsed:.1f} transfers/sec)"
+        )
+        if total != expected_total or net_transfers != 0 or negative:
+            self.stderr.write(
+                f'Money was not conserved: total {total} (expected {expected_total}), '
+                f'net transfers {net_transfers}, {negative} negative balances.'
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Money conserved: {total} BDT across {len(account_ids)} accounts.'))
@@ -0,0 +1,77 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from core.parallel import default_workers, id_ranges, run_in_pool
+from transactions.filters import month_bounds, parse_period, previous_month
+from transactions.statements import (
+    generate_statement_range, is_shard_done, period_directory, read_shard_manifest, write_file,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Render HTML and plain-text monthly statements for every account into '
+        '<output>/<YYYY>/<MM>/, in parallel by account id range. Finished shards '
+        'are skipped on a rerun, so an interrupted run can simply be restarted; '
+        '--force renders every shard again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', help='Month as YYYY-MM (default: last month).')
+        parser.add_argument('--output', default='statements', help='Root directory of the statement tree.')
+        parser.add_argument('--workers', type=int, default=default_workers())
+        parser.add_argument('--shard-size', type=int, default=5000, help='Accounts per shard (by id range).')
+        parser.add_argument('--force', action='store_true', help='Ignore finished shards and render them again.')
+
+    def handle(self, *args, **options):
+        try:
+            period = parse_period(options['period']) if options['period'] else previous_month(timezone.localdate())
+        except ValueError:
+            raise CommandError('--period must look like 2026-09.')
+        start, end = month_bounds(period)
+        if end >= timezone.localdate():
+            raise CommandError(f'{start:%Y-%m} has not ended yet.')
+        root = os.path.abspath(options['output'])
+
+        shards = id_ranges(UserBankAccount.objects.all(), options['shard_size'])
+        todo = [
+            (low, high) for low, high in shards
+            if options['force'] or not is_shard_done(root, start, low, high)
+        ]
+        if len(todo) < len(shards):
+            self.stdout.write(f'Resuming: {len(shards) - len(todo)} of {len(shards)} shards already done.')
+
+        started = time.perf_counter()
+        accounts = 0
+        tasks = [(low, high, start, root) for low, high in todo]
+        for result in run_in_pool(generate_statement_range, tasks, options['workers']):
+            accounts += result['accounts']
+            self.stdout.write(f"Shard {result['directory']}: {result['accounts']} statements")
+        elapsed = time.perf_counter() - started
+
+        manifests = [read_shard_manifest(root, start, low, high) for low, high in shards]
+        directory = period_directory(root, start)
+        os.makedirs(directory, exist_ok=True)
+        write_file(os.path.join(directory, 'manifest.json'), json.dumps({
+            'period': f'{start:%Y-%m}',
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'generated_at': timezone.now().isoformat(),
+            'accounts': sum(m['accounts'] for m in manifests),
+            'transactions': sum(m['transactions'] for m in manifests),
+            'shards': [
+                {key: m[key] for key in ('low', 'high', 'directory', 'accounts', 'transactions')}
+                for m in manifests
+            ],
+        }, indent=2))
+
+        rate = accounts / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {accounts} statements for {start:%Y-%m} in {len(todo)} shards in {elapsed:.2f}s '
+            f'({rate:,.0f} accounts/sec) into {directory}.'
+        ))
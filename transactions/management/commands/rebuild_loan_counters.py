@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import UserBankAccount
+from core.parallel import id_ranges
+from transactions.loans import rebuild_loan_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the loan counters on every account from the Transaction table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Accounts per batch (by id range).')
+
+    def handle(self, *args, **options):
+        repaired = 0
+        for low, high in id_ranges(UserBankAccount.objects.all(), options['chunk_size']):
+            repaired += rebuild_loan_counters(low, high)
+        self.stdout.write(f'Repaired loan counters on {repaired} accounts.')
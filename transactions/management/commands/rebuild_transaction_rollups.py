@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import UserBankAccount
+from core.parallel import default_workers, id_ranges, run_in_pool
+from transactions.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the per-account daily and monthly transaction rollups from the Transaction '
+        'table and the archive. Run once after migrating, and after editing transactions by hand.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=default_workers())
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Accounts per batch (by id range).')
+
+    def handle(self, *args, **options):
+        tasks = id_ranges(UserBankAccount.objects.all(), options['chunk_size'])
+        buckets = sum(run_in_pool(rebuild_rollups, tasks, options['workers']))
+        self.stdout.write(f'Rebuilt {buckets} rollup buckets for {len(tasks)} account batches.')
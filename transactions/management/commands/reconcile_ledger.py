@@ -0,0 +1,53 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import UserBankAccount
+from core.parallel import default_workers, id_ranges, run_in_pool
+from transactions.reconcile import reconcile_range
+
+
+class Command(BaseCommand):
+    help = 'Check every account balance against the sum of its transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=default_workers())
+        parser.add_argument('--shard-size', type=int, default=5000, help='Accounts per shard (by id range).')
+        parser.add_argument('--output', help='Write the discrepancy report as JSON to this file.')
+
+    def handle(self, *args, **options):
+        shards = id_ranges(UserBankAccount.objects.all(), options['shard_size'])
+        started = time.perf_counter()
+        accounts = transactions = 0
+        discrepancies = []
+
+        for result in run_in_pool(reconcile_range, shards, options['workers']):
+            accounts += result['accounts']
+            transactions += result['transactions']
+            discrepancies.extend(result['discrepancies'])
+        elapsed = time.perf_counter() - started
+
+        for item in discrepancies:
+            self.stdout.write(
+                f"Account {item['account_no']}: balance {item['balance']}, "
+                f"ledger {item['ledger']}, difference {item['difference']}"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'accounts': accounts,
+                    'transactions': transactions,
+                    'seconds': round(elapsed, 3),
+                    'discrepancies': discrepancies,
+                }, f, indent=2)
+
+        rate = transactions / elapsed if elapsed else 0
+        summary = (
+            f'Reconciled {accounts} accounts and {transactions} transactions in {len(shards)} shards '
+            f'in {elapsed:.2f}s ({rate:,.0f} transactions/sec): {len(discrepancies)} discrepancies.'
+        )
+        if discrepancies:
+            self.stdout.write(self.style.WARNING(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
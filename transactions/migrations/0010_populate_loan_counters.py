@@ -0,0 +1,37 @@
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+LOAN = 3
+
+
+def populate_loan_counters(apps, schema_editor):
+    Transaction = apps.get_model('transactions', 'Transaction')
+    UserBankAccount = apps.get_model('accounts', 'UserBankAccount')
+    rows = (
+        Transaction.objects.filter(transaction_type=LOAN)
+        .order_by()
+        .values('account_id')
+        .annotate(
+            active=Count('pk', filter=Q(loan_approve=True)),
+            pending=Count('pk', filter=Q(loan_approve=False)),
+            principal=Sum('amount', filter=Q(loan_approve=True)),
+        )
+    )
+    for row in rows.iterator():
+        UserBankAccount.objects.filter(pk=row['account_id']).update(
+            active_loan_count=row['active'],
+            pending_loan_count=row['pending'],
+            outstanding_loan_principal=row['principal'] or 0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_loan_counters'),
+        ('transactions', '0009_balancecheckpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_loan_counters, migrations.RunPython.noop),
+    ]
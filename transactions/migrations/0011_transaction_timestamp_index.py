@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_loan_counters'),
+        ('transactions', '0010_populate_loan_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['timestamp'], name='txn_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_account_number_sequence'),
+        ('transactions', '0012_interest'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='interestaccrual',
+            name='transaction',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='interest_accrual', to='transactions.transaction'),
+        ),
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the archived month.')),
+                ('path', models.CharField(help_text='Relative to TRANSACTION_ARCHIVE_ROOT.', max_length=255)),
+                ('row_count', models.PositiveIntegerField()),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('net_total', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('totals', models.JSONField(default=dict)),
+                ('sha256', models.CharField(max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_segments', to='accounts.userbankaccount')),
+            ],
+            options={
+                'ordering': ['month'],
+                'constraints': [models.UniqueConstraint(fields=('account', 'month'), name='unique_archive_segment_per_month')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.7 on 2026-10-18 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_account_number_sequence'),
+        ('transactions', '0013_archive_segment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_type', models.CharField(choices=[('D', 'Day'), ('M', 'Month')], max_length=1)),
+                ('period', models.DateField(help_text='The day, or the first day of the month.')),
+                ('transaction_type', models.IntegerField(choices=[(1, 'Deposite'), (2, 'Withdrawal'), (3, 'Loan'), (4, 'Loan Paid'), (5, 'Transfer'), (6, 'Interest')])),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='accounts.userbankaccount')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'period_type', 'period', 'transaction_type'), name='unique_rollup_bucket')],
+            },
+        ),
+    ]
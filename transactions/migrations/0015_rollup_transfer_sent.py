@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0014_transaction_rollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transactionrollup',
+            name='transaction_type',
+            field=models.IntegerField(choices=[(1, 'Deposite'), (2, 'Withdrawal'), (3, 'Loan'), (4, 'Loan Paid'), (5, 'Transfer Received'), (-5, 'Transfer Sent'), (6, 'Interest')]),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0015_rollup_transfer_sent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivesegment',
+            name='root',
+            field=models.CharField(blank=True, help_text='Absolute archive root the path is relative to.', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='archivesegment',
+            name='path',
+            field=models.CharField(help_text='Relative to root.', max_length=255),
+        ),
+    ]
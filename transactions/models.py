@@ -1,6 +1,6 @@
 from django.db import models
 from accounts.models import UserBankAccount
-from .constants import TRANSACTION_TYPE
+from .constants import ROLLUP_TYPE, TRANSACTION_TYPE
 # Create your models here.
 class Transaction(models.Model):
     account = models.ForeignKey(UserBankAccount, related_name= 'transactions', on_delete=models.CASCADE)
@@ -12,6 +12,103 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Report, statement and cursor pagination scans for one account.
+            models.Index(fields=['account', 'timestamp', 'id'], name='txn_account_timestamp_idx'),
+            # Loan limit checks and the loan list.
+            models.Index(fields=['account', 'transaction_type', 'loan_approve'], name='txn_account_loan_idx'),
+            # Admin date_hierarchy and ordering over the whole table.
+            models.Index(fields=['timestamp'], name='txn_timestamp_idx'),
+        ]
+
+class BalanceCheckpoint(models.Model):
+    account = models.ForeignKey(UserBankAccount, related_name='balance_checkpoints', on_delete=models.CASCADE)
+    day = models.DateField()
+    opening_balance = models.DecimalField(decimal_places=2, max_digits=12)
+    closing_balance = models.DecimalField(decimal_places=2, max_digits=12)
+
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'day'], name='unique_checkpoint_per_day'),
+        ]
+
+    def __str__(self):
+        return f'{self.account} {self.day}: {self.opening_balance} -> {self.closing_balance}'
+
+class InterestAccrual(models.Model):
+    """Interest credited to an account for one period; makes ``accrue_interest`` safe to re-run."""
+    account = models.ForeignKey(UserBankAccount, related_name='interest_accruals', on_delete=models.CASCADE)
+    period = models.DateField(help_text='First day of the accrual month.')
+    amount = models.DecimalField(decimal_places=2, max_digits=12)
+    # Kept when the credit itself is archived, so the period stays accrued.
+    transaction = models.OneToOneField(
+        Transaction, related_name='interest_accrual', on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'period'], name='unique_interest_per_period'),
+        ]
+
+    def __str__(self):
+        return f'{self.account} {self.period:%Y-%m}: {self.amount}'
+
+class TransactionRollup(models.Model):
+    """Count and sum of ``amount`` of an account's transactions of one type, per day and per month.
+
+    Maintained by the posting functions; ``rebuild_transaction_rollups``
+    recomputes them from the table and the archive.
+    """
+    DAILY = 'D'
+    MONTHLY = 'M'
+    PERIOD_TYPES = ((DAILY, 'Day'), (MONTHLY, 'Month'))
+
+    account = models.ForeignKey(UserBankAccount, related_name='rollups', on_delete=models.CASCADE)
+    period_type = models.CharField(max_length=1, choices=PERIOD_TYPES)
+    period = models.DateField(help_text='The day, or the first day of the month.')
+    # Sent transfers are TRANSFER_SENT with a positive total.
+    transaction_type = models.IntegerField(choices=ROLLUP_TYPE)
+    count = models.IntegerField(default=0)
+    total = models.DecimalField(decimal_places=2, max_digits=14, default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves the report's (account, period_type, period range) lookup.
+            models.UniqueConstraint(
+                fields=['account', 'period_type', 'period', 'transaction_type'], name='unique_rollup_bucket',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.account} {self.period_type} {self.period}: {self.count} x {self.transaction_type} = {self.total}'
+
+class ArchiveSegment(models.Model):
+    """One account-month of transactions moved to a gzipped JSON lines file by ``archive_transactions``."""
+    account = models.ForeignKey(UserBankAccount, related_name='archive_segments', on_delete=models.CASCADE)
+    month = models.DateField(help_text='First day of the archived month.')
+    # Set when archived with ``--output``; blank means TRANSACTION_ARCHIVE_ROOT.
+    root = models.CharField(max_length=255, blank=True, help_text='Absolute archive root the path is relative to.')
+    path = models.CharField(max_length=255, help_text='Relative to root.')
+    row_count = models.PositiveIntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    # Sum of the rows' signed balance effect, for ledger reconciliation.
+    net_total = models.DecimalField(decimal_places=2, max_digits=14)
+    # {transaction_type: [count, total amount]}
+    totals = models.JSONField(default=dict)
+    sha256 = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['month']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'month'], name='unique_archive_segment_per_month'),
+        ]
+
+    def __str__(self):
+        return f'{self.account} {self.month:%Y-%m}: {self.row_count} rows'
 
 class Bank(models.Model):
     bankrupt = models.BooleanField(default=False)
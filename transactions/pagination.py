@@ -0,0 +1,94 @@
+"""Keyset (cursor) pagination over ``(timestamp, id)``.
+
+Unlike OFFSET pagination the cost of a page doesn't grow with its position in
+the history: every page is one indexed range scan of ``page_size + 1`` rows.
+Archived rows (see ``transactions.archive``) are merged into the page in the
+same order when an ``ArchiveReader`` is passed.
+"""
+import base64
+import heapq
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+
+
+def encode_cursor(timestamp, pk):
+    raw = f'{timestamp.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(timestamp, pk)`` for a cursor, or ``None`` if it is malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, pk = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def row_key(row):
+    return row.timestamp, row.pk
+
+
+def get_page_size(params):
+    """Page size from ``?page_size=``, bounded by the report page size settings."""
+    page_size = getattr(settings, 'TRANSACTION_REPORT_PAGE_SIZE', 50)
+    max_page_size = getattr(settings, 'TRANSACTION_REPORT_MAX_PAGE_SIZE', 500)
+    try:
+        page_size = int(params.get('page_size', page_size))
+    except ValueError:
+        pass
+    return max(1, min(page_size, max_page_size))
+
+
+class KeysetPage:
+    def __init__(self, items, has_next, has_previous):
+        self.items = items
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.items:
+            return encode_cursor(self.items[-1].timestamp, self.items[-1].pk)
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.items:
+            return encode_cursor(self.items[0].timestamp, self.items[0].pk)
+        return None
+
+
+class KeysetPaginator:
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def paginate(self, queryset, after=None, before=None, archive=None):
+        """Return the page after cursor ``after``, before cursor ``before``, or the first page."""
+        after, before = decode_cursor(after), decode_cursor(before)
+        size = self.page_size
+
+        if before:
+            timestamp, pk = before
+            rows = list(
+                queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, pk__lt=pk))
+                .order_by('-timestamp', '-pk')[:size + 1]
+            )
+            if archive:
+                rows = list(islice(heapq.merge(rows, archive.rows(before=before), key=row_key, reverse=True), size + 1))
+            has_previous = len(rows) > size
+            return KeysetPage(rows[:size][::-1], has_next=True, has_previous=has_previous)
+
+        if after:
+            timestamp, pk = after
+            queryset = queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, pk__gt=pk))
+        rows = list(queryset.order_by('timestamp', 'pk')[:size + 1])
+        if archive:
+            rows = list(islice(heapq.merge(rows, archive.rows(after=after), key=row_key), size + 1))
+        return KeysetPage(rows[:size], has_next=len(rows) > size, has_previous=after is not None)
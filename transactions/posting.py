@@ -0,0 +1,282 @@
+"""Posting engine for every balance-changing operation.
+
+Accounts are locked with ``SELECT ... FOR UPDATE`` in primary key order so
+two concurrent transfers between the same pair of accounts can never
+deadlock. Balance deltas are applied in SQL with ``F()`` expressions and the
+``Transaction`` rows are written with a single ``bulk_create``, all inside one
+atomic block. Every balance change bumps ``balance_version`` and writes the
+new balance through to ``accounts.balance_cache`` on commit.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.contrib.auth.models import User
+from django.db.models import Case, DecimalField, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+
+from accounts.balance_cache import store_balances_on_commit
+from accounts.models import UserBankAccount
+from .balances import record_balance_changes
+from .constants import DEPOSIT, WITHDRAWAL, LOAN, LOAN_PAID, TRANSFER, MAX_ACTIVE_LOANS
+from .models import Transaction
+from .rollups import add_to_rollups, rollup_changes
+
+
+class PostingError(Exception):
+    pass
+
+
+class InsufficientFunds(PostingError):
+    def __init__(self, account, balance, amount):
+        self.account = account
+        self.balance = balance
+        self.amount = amount
+        super().__init__(
+            f'Account {account.account_no} has {balance} BDT, cannot debit {amount} BDT.'
+        )
+
+
+def lock_accounts(account_ids):
+    """Lock the given accounts in primary key order and return them by id."""
+    queryset = (
+        UserBankAccount.objects.select_for_update()
+        .filter(pk__in=set(account_ids))
+        .order_by('pk')
+    )
+    return {account.pk: account for account in queryset}
+
+
+def apply_deltas(deltas, chunk_size=500):
+    """Add ``deltas[account_id]`` to each account balance in SQL.
+
+    All accounts are updated by a single ``UPDATE ... CASE`` per chunk; the
+    rows must already be locked by ``lock_accounts``.
+    """
+    account_ids = sorted(pk for pk, delta in deltas.items() if delta)
+    for offset in range(0, len(account_ids), chunk_size):
+        chunk = account_ids[offset:offset + chunk_size]
+        if len(chunk) == 1:
+            change = Value(deltas[chunk[0]])
+        else:
+            change = Case(
+                *[When(pk=pk, then=Value(deltas[pk])) for pk in chunk],
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        UserBankAccount.objects.filter(pk__in=chunk).update(
+            balance=F('balance') + change,
+            balance_version=F('balance_version') + 1,
+        )
+
+
+def post_entries(entries):
+    """Post ``(account, delta, amount, transaction_type)`` entries atomically.
+
+    ``delta`` is the signed balance change, ``amount`` is what gets stored on
+    the ``Transaction`` row. Raises ``InsufficientFunds`` if the entries'
+    total debit would take an account below zero. The passed account
+    instances are updated with their new balances.
+    """
+    with transaction.atomic():
+        locked = lock_accounts(account.pk for account, *_ in entries)
+        for account, *_ in entries:
+            if account.pk not in locked:
+                raise PostingError(f'Account {account.account_no} no longer exists.')
+        deltas = defaultdict(int)
+        debits = defaultdict(int)
+        for account, delta, *_ in entries:
+            deltas[account.pk] += delta
+            if delta < 0:
+                debits[account.pk] -= delta
+        for pk, debit in debits.items():
+            if locked[pk].balance + deltas[pk] < 0:
+                raise InsufficientFunds(locked[pk], locked[pk].balance, debit)
+
+        running = {pk: account.balance for pk, account in locked.items()}
+        rows = []
+        for account, delta, amount, transaction_type in entries:
+            running[account.pk] += delta
+            balance = running[account.pk]
+            rows.append(Transaction(
+                account=account,
+                amount=amount,
+                balance_after_transaction=balance,
+                transaction_type=transaction_type,
+            ))
+
+        apply_deltas(deltas)
+        created = Transaction.objects.bulk_create(rows)
+        add_to_rollups(rollup_changes(created))
+        record_balance_changes({
+            pk: (locked[pk].balance, running[pk]) for pk in deltas
+        })
+        store_balances_on_commit(
+            (locked[pk].user_id, locked[pk].balance_version + 1, running[pk])
+            for pk, delta in deltas.items() if delta
+        )
+
+    for account, *_ in entries:
+        account.balance = running[account.pk]
+        if deltas[account.pk]:
+            account.balance_version = locked[account.pk].balance_version + 1
+    return created
+
+
+def post_deposit(account, amount):
+    return post_entries([(account, amount, amount, DEPOSIT)])[0]
+
+
+def post_withdrawal(account, amount):
+    return post_entries([(account, -amount, amount, WITHDRAWAL)])[0]
+
+
+def post_transfer(sender_account, recipient_account, amount):
+    """Move ``amount`` between two accounts; returns the (debit, credit) rows."""
+    if sender_account.pk == recipient_account.pk:
+        raise PostingError('Same account money transfer cannot be possible.')
+    debit, credit = post_entries([
+        (sender_account, -amount, -amount, TRANSFER),
+        (recipient_account, amount, amount, TRANSFER),
+    ])
+    return debit, credit
+
+
+def post_batch_transfer(sender_account, transfers):
+    """Pay every ``(recipient_account, amount)`` from ``sender_account`` in one unit.
+
+    The sender's total is checked against their balance once, all credits are
+    applied with one set-based update and every ``Transaction`` row goes in a
+    single ``bulk_create``. Returns the ``(debit, credit)`` row pairs in order.
+    """
+    entries = []
+    for recipient_account, amount in transfers:
+        if recipient_account.pk == sender_account.pk:
+            raise PostingError('Same account money transfer cannot be possible.')
+        entries.append((sender_account, -amount, -amount, TRANSFER))
+        entries.append((recipient_account, amount, amount, TRANSFER))
+    rows = post_entries(entries)
+    return list(zip(rows[::2], rows[1::2]))
+
+
+class LoanLimitExceeded(PostingError):
+    pass
+
+
+def request_loan(account, amount, max_active_loans=MAX_ACTIVE_LOANS):
+    """Record a pending loan request, enforcing the active loan limit under lock."""
+    with transaction.atomic():
+        locked = lock_accounts([account.pk])[account.pk]
+        if locked.active_loan_count >= max_active_loans:
+            raise LoanLimitExceeded('You have crossed your loan limit.')
+        loan = Transaction.objects.create(
+            account=account,
+            amount=amount,
+            balance_after_transaction=locked.balance,
+            transaction_type=LOAN,
+        )
+        add_to_rollups(rollup_changes([loan]))
+        UserBankAccount.objects.filter(pk=account.pk).update(pending_loan_count=F('pending_loan_count') + 1)
+    account.pending_loan_count = locked.pending_loan_count + 1
+    return loan
+
+
+def by_account(values, output_field):
+    """``CASE`` expression mapping account ids to ``values[account_id]``."""
+    return Case(
+        *[When(pk=pk, then=Value(value)) for pk, value in values.items()],
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def approve_loans(loan_ids):
+    """Approve and credit the given pending loans in one atomic pass.
+
+    Loans that are already approved (or aren't loans) are skipped, so saving
+    an approved loan again can never credit it twice. Balances and loan
+    counters are updated with one set-based ``UPDATE`` and the loans with one
+    ``bulk_update``. Returns the approved loans with ``account`` (and its
+    user) loaded and carrying the new balance.
+    """
+    with transaction.atomic():
+        loans = list(
+            Transaction.objects.select_for_update()
+            .filter(pk__in=list(loan_ids), transaction_type=LOAN, loan_approve=False)
+            .order_by('account_id', 'timestamp', 'pk')
+        )
+        if not loans:
+            return []
+        locked = lock_accounts(loan.account_id for loan in loans)
+        running = {pk: account.balance for pk, account in locked.items()}
+        principal = defaultdict(int)
+        counts = defaultdict(int)
+        for loan in loans:
+            running[loan.account_id] += loan.amount
+            principal[loan.account_id] += loan.amount
+            counts[loan.account_id] += 1
+            loan.loan_approve = True
+            loan.balance_after_transaction = running[loan.account_id]
+
+        money = DecimalField(max_digits=12, decimal_places=2)
+        UserBankAccount.objects.filter(pk__in=list(counts)).update(
+            balance=F('balance') + by_account(principal, money),
+            pending_loan_count=Greatest(F('pending_loan_count') - by_account(counts, IntegerField()), 0),
+            active_loan_count=F('active_loan_count') + by_account(counts, IntegerField()),
+            outstanding_loan_principal=F('outstanding_loan_principal') + by_account(principal, money),
+            balance_version=F('balance_version') + 1,
+        )
+        Transaction.objects.bulk_update(loans, ['loan_approve', 'balance_after_transaction'], batch_size=1000)
+        record_balance_changes({
+            pk: (locked[pk].balance, running[pk]) for pk in counts
+        })
+        store_balances_on_commit(
+            (locked[pk].user_id, locked[pk].balance_version + 1, running[pk]) for pk in counts
+        )
+
+    users = {user.pk: user for user in User.objects.filter(pk__in=[a.user_id for a in locked.values()])}
+    for account in locked.values():
+        account.balance = running[account.pk]
+        account.balance_version += 1
+        account.user = users[account.user_id]
+    for loan in loans:
+        loan.account = locked[loan.account_id]
+    return loans
+
+
+def approve_loan(loan):
+    """Approve a single loan; returns it, or ``None`` if it was already approved."""
+    approved = approve_loans([loan.pk])
+    if not approved:
+        return None
+    loan.loan_approve = True
+    loan.balance_after_transaction = approved[0].balance_after_transaction
+    loan.account.balance = approved[0].account.balance
+    return loan
+
+
+def pay_loan(loan):
+    """Debit an approved loan from its account and mark it as paid."""
+    with transaction.atomic():
+        loan = Transaction.objects.select_for_update().get(pk=loan.pk)
+        if loan.transaction_type != LOAN or not loan.loan_approve:
+            raise PostingError('Only approved loans can be paid.')
+        account = lock_accounts([loan.account_id])[loan.account_id]
+        if loan.amount > account.balance:
+            raise InsufficientFunds(account, account.balance, loan.amount)
+        UserBankAccount.objects.filter(pk=account.pk).update(
+            balance=F('balance') - loan.amount,
+            active_loan_count=F('active_loan_count') - 1,
+            outstanding_loan_principal=F('outstanding_loan_principal') - loan.amount,
+            balance_version=F('balance_version') + 1,
+        )
+        record_balance_changes({account.pk: (account.balance, account.balance - loan.amount)})
+        account.balance -= loan.amount
+        account.balance_version += 1
+        store_balances_on_commit([(account.user_id, account.balance_version, account.balance)])
+        loan.account = account
+        loan.balance_after_transaction = account.balance
+        # Move the loan from its LOAN buckets to the LOAN_PAID ones.
+        moved = rollup_changes([loan], sign=-1)
+        loan.transaction_type = LOAN_PAID
+        add_to_rollups(rollup_changes([loan], changes=moved))
+        loan.save(update_fields=['balance_after_transaction', 'transaction_type'])
+    return loan
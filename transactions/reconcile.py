@@ -0,0 +1,61 @@
+"""Compare stored account balances against their Transaction history.
+
+The history includes archived months, through their segments' net totals.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+
+from accounts.models import UserBankAccount
+from .ledger import signed_amount
+from .models import ArchiveSegment, Transaction
+
+CENTS = Decimal('0.01')
+
+
+def reconcile_range(low, high):
+    """Reconcile accounts with ``low <= id < high``; runs inside a pool worker.
+
+    One grouped aggregate over the shard's transactions, one over its archive
+    segments, and one read of the shard's balances.
+    """
+    totals = {
+        account_id: (total, count)
+        for account_id, total, count in (
+            Transaction.objects.filter(account_id__gte=low, account_id__lt=high)
+            .order_by()
+            .values('account_id')
+            .annotate(total=Sum(signed_amount()), count=Count('pk'))
+            .values_list('account_id', 'total', 'count')
+        )
+    }
+    for account_id, total, count in (
+        ArchiveSegment.objects.filter(account_id__gte=low, account_id__lt=high)
+        .order_by()
+        .values('account_id')
+        .annotate(total=Sum('net_total'), count=Sum('row_count'))
+        .values_list('account_id', 'total', 'count')
+    ):
+        live_total, live_count = totals.get(account_id, (0, 0))
+        totals[account_id] = ((live_total or 0) + total, live_count + count)
+    accounts = UserBankAccount.objects.filter(pk__gte=low, pk__lt=high).values_list('pk', 'account_no', 'balance')
+
+    discrepancies = []
+    account_count = transaction_count = 0
+    for account_id, account_no, balance in accounts:
+        ledger_total, count = totals.get(account_id, (0, 0))
+        ledger_total = Decimal(ledger_total or 0).quantize(CENTS)
+        account_count += 1
+        transaction_count += count
+        if ledger_total != balance:
+            discrepancies.append({
+                'account_no': account_no,
+                'balance': str(balance),
+                'ledger': str(ledger_total),
+                'difference': str(balance - ledger_total),
+            })
+    return {
+        'accounts': account_count,
+        'transactions': transaction_count,
+        'discrepancies': discrepancies,
+    }
@@ -0,0 +1,198 @@
+"""Per-account transaction totals by type, per day and per month.
+
+The posting functions add their rows to the day and month buckets of
+``TransactionRollup`` in the same transaction, while the accounts are
+locked, so a bucket is never updated concurrently. Paying a loan moves the
+row from the LOAN buckets to the LOAN_PAID buckets of the day it was
+requested. The sender's (negative) leg of a transfer goes to TRANSFER_SENT
+buckets as a positive amount, so TRANSFER buckets only count money received.
+Archiving leaves the buckets alone.
+
+``rollup_totals`` answers "how much of each type in this date range" with
+whole months for the part of the range they cover and days for the ragged
+ends, so one small indexed query regardless of the number of rows.
+"""
+import gzip
+import hashlib
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from .archive import decode_row, segment_file
+from .constants import ROLLUP_TYPE, TRANSFER, TRANSFER_SENT
+from .filters import month_bounds
+from .models import ArchiveSegment, Transaction, TransactionRollup
+
+DAILY, MONTHLY = TransactionRollup.DAILY, TransactionRollup.MONTHLY
+
+
+def buckets(account_id, day, transaction_type):
+    return (account_id, DAILY, day, transaction_type), (account_id, MONTHLY, day.replace(day=1), transaction_type)
+
+
+def rollup_type(transaction_type, amount):
+    """The bucket type and amount a row is counted under."""
+    if transaction_type == TRANSFER and amount < 0:
+        return TRANSFER_SENT, -amount
+    return transaction_type, amount
+
+
+def new_changes():
+    return defaultdict(lambda: [0, Decimal('0')])
+
+
+def add_change(changes, account_id, day, transaction_type, count, total):
+    for key in buckets(account_id, day, transaction_type):
+        changes[key][0] += count
+        changes[key][1] += total
+
+
+def rollup_changes(rows, sign=1, changes=None):
+    """``{bucket: [count, total]}`` increments for adding ``rows`` (or removing them, with ``sign=-1``)."""
+    changes = new_changes() if changes is None else changes
+    for row in rows:
+        transaction_type, amount = rollup_type(row.transaction_type, row.amount)
+        add_change(changes, row.account_id, timezone.localtime(row.timestamp).date(), transaction_type, sign, sign * amount)
+    return changes
+
+
+def add_to_rollups(changes):
+    """Apply ``{bucket: (count, total)}`` increments.
+
+    Must run inside the posting transaction, while the accounts are locked.
+    Existing buckets are read and written back with one ``bulk_update``,
+    new ones go in with one ``bulk_create``; buckets left empty are deleted.
+    """
+    changes = {key: value for key, value in changes.items() if any(value)}
+    if not changes:
+        return
+    existing = TransactionRollup.objects.filter(
+        account_id__in={key[0] for key in changes},
+        period__in={key[2] for key in changes},
+        transaction_type__in={key[3] for key in changes},
+    )
+    updated = []
+    emptied = []
+    for rollup in existing:
+        key = (rollup.account_id, rollup.period_type, rollup.period, rollup.transaction_type)
+        if key in changes:
+            count, total = changes.pop(key)
+            rollup.count += count
+            rollup.total += total
+            # E.g. the LOAN bucket of a day whose only loan has been paid.
+            (updated if rollup.count or rollup.total else emptied).append(rollup)
+    TransactionRollup.objects.bulk_update(updated, ['count', 'total'], batch_size=1000)
+    if emptied:
+        TransactionRollup.objects.filter(pk__in=[rollup.pk for rollup in emptied]).delete()
+    TransactionRollup.objects.bulk_create(
+        [
+            TransactionRollup(
+                account_id=account_id, period_type=period_type, period=period,
+                transaction_type=transaction_type, count=count, total=total,
+            )
+            for (account_id, period_type, period, transaction_type), (count, total) in changes.items()
+        ],
+        batch_size=1000,
+    )
+
+
+def period_filter(start_date=None, end_date=None):
+    """``Q`` selecting the buckets that exactly cover ``start_date``..``end_date`` (inclusive)."""
+    def next_month(day):
+        return month_bounds(day)[1] + timedelta(days=1)
+
+    # Whole months are [first_month, after_months); the days outside them come from daily buckets.
+    first_month = None if start_date is None else (start_date if start_date.day == 1 else next_month(start_date))
+    after_months = None if end_date is None else (
+        next_month(end_date) if end_date == month_bounds(end_date)[1] else end_date.replace(day=1)
+    )
+    if first_month and after_months and first_month >= after_months:
+        return Q(period_type=DAILY, period__gte=start_date, period__lte=end_date)
+
+    months = Q(period_type=MONTHLY)
+    if first_month:
+        months &= Q(period__gte=first_month)
+    if after_months:
+        months &= Q(period__lt=after_months)
+    if start_date and start_date < first_month:
+        months |= Q(period_type=DAILY, period__gte=start_date, period__lt=first_month)
+    if end_date and after_months <= end_date:
+        months |= Q(period_type=DAILY, period__gte=after_months, period__lte=end_date)
+    return months
+
+
+def rollup_totals(account, start_date=None, end_date=None):
+    """Per-type count and total of ``account``'s transactions between two optional dates."""
+    labels = dict(ROLLUP_TYPE)
+    order = list(labels)
+    rows = (
+        TransactionRollup.objects.filter(period_filter(start_date, end_date), account=account)
+        .order_by()
+        .values('transaction_type')
+        .annotate(transactions=Sum('count'), amount=Sum('total'))
+        .filter(transactions__gt=0)
+    )
+    rows = sorted(rows, key=lambda row: order.index(row['transaction_type']) if row['transaction_type'] in labels else len(order))
+    return [dict(row, label=labels.get(row['transaction_type'], '')) for row in rows]
+
+
+def segment_changes(segment):
+    """The sha256 of a segment file and the rollup increments for its rows."""
+    with open(segment_file(segment), 'rb') as f:
+        data = f.read()
+    changes = new_changes()
+    for line in gzip.decompress(data).decode('utf-8').splitlines():
+        if line.strip():
+            _, timestamp, transaction_type, amount, _, _ = decode_row(line)
+            transaction_type, amount = rollup_type(transaction_type, amount)
+            add_change(changes, segment.account_id, timezone.localtime(timestamp).date(), transaction_type, 1, amount)
+    return hashlib.sha256(data).hexdigest(), changes
+
+
+def rebuild_rollups(low, high):
+    """Recompute the rollups of accounts with ``low <= id < high`` from the table and the archive.
+
+    Archive segments are decompressed before the accounts are locked; under
+    the lock only files whose checksum no longer matches their segment row
+    (rewritten by the archiver in the meantime) are read again. The
+    lock then makes postings wait instead of updating buckets that are being
+    replaced. Returns the number of buckets.
+    """
+    segments = ArchiveSegment.objects.filter(account_id__gte=low, account_id__lt=high)
+    archived = {segment.pk: segment_changes(segment) for segment in segments}
+
+    changes = new_changes()
+    with transaction.atomic():
+        list(UserBankAccount.objects.select_for_update().filter(pk__gte=low, pk__lt=high).values_list('pk'))
+        bucket_type = Case(
+            When(transaction_type=TRANSFER, amount__lt=0, then=Value(TRANSFER_SENT)),
+            default=F('transaction_type'),
+            output_field=IntegerField(),
+        )
+        rows = (
+            Transaction.objects.filter(account_id__gte=low, account_id__lt=high)
+            .annotate(day=TruncDate('timestamp'), bucket_type=bucket_type)
+            .order_by()
+            .values('account_id', 'day', 'bucket_type')
+            .annotate(transactions=Count('pk'), amount=Sum('amount'))
+            .values_list('account_id', 'day', 'bucket_type', 'transactions', 'amount')
+        )
+        for account_id, day, transaction_type, count, total in rows:
+            add_change(changes, account_id, day, transaction_type, count, -total if transaction_type == TRANSFER_SENT else total)
+        for segment in segments.all():
+            sha256, segment_total = archived.get(segment.pk, (None, None))
+            if sha256 != segment.sha256:
+                _, segment_total = segment_changes(segment)
+            for key, (count, total) in segment_total.items():
+                changes[key][0] += count
+                changes[key][1] += total
+
+        TransactionRollup.objects.filter(account_id__gte=low, account_id__lt=high).delete()
+        add_to_rollups(changes)
+    return len(changes)
@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .bank_status import invalidate_bank_status
+from .models import Bank
+
+
+@receiver(post_save, sender=Bank)
+@receiver(post_delete, sender=Bank)
+def bank_changed(sender, **kwargs):
+    invalidate_bank_status()
+    transaction.on_commit(invalidate_bank_status)
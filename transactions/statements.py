@@ -0,0 +1,139 @@
+"""Monthly statements rendered to disk by ``manage.py generate_statements``.
+
+Output layout for a period::
+
+    <root>/<YYYY>/<MM>/manifest.json
+    <root>/<YYYY>/<MM>/<low>-<high>/<account_no>.html
+    <root>/<YYYY>/<MM>/<low>-<high>/<account_no>.txt
+    <root>/<YYYY>/<MM>/<low>-<high>/_done.json
+
+Each shard is an account id range rendered by one pool worker with two
+queries: the shard's accounts with their opening and closing balances, and
+the shard's transactions for the month in account order. For an archived
+month a third query finds the shard's segments, which are merged in. ``_done.json`` is
+written last, so a shard without it is regenerated on the next run.
+"""
+import heapq
+import json
+import os
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from .archive import FIELDS, archived_rows_for_month
+from .balances import annotate_balance_as_of
+from .constants import TRANSACTION_TYPE
+from .filters import filter_date_range, month_bounds
+from .ledger import signed_delta
+from .models import Transaction
+
+DONE_MARKER = '_done.json'
+
+
+def period_directory(root, period):
+    return os.path.join(root, f'{period:%Y}', f'{period:%m}')
+
+
+def shard_directory(root, period, low, high):
+    return os.path.join(period_directory(root, period), f'{low:010d}-{high:010d}')
+
+
+def is_shard_done(root, period, low, high):
+    return os.path.exists(os.path.join(shard_directory(root, period, low, high), DONE_MARKER))
+
+
+def read_shard_manifest(root, period, low, high):
+    with open(os.path.join(shard_directory(root, period, low, high), DONE_MARKER)) as f:
+        return json.load(f)
+
+
+def write_file(path, content):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def generate_statement_range(low, high, period, root):
+    """Render statements for accounts with ``low <= id < high``; runs inside a pool worker."""
+    start, end = month_bounds(period)
+    directory = shard_directory(root, period, low, high)
+    os.makedirs(directory, exist_ok=True)
+    html_template = get_template('transactions/statement.html')
+    text_template = get_template('transactions/statement.txt')
+    chunk_size = getattr(settings, 'STATEMENT_EXPORT_CHUNK_SIZE', 2000)
+    type_labels = dict(TRANSACTION_TYPE)
+
+    accounts = UserBankAccount.objects.filter(pk__gte=low, pk__lt=high).select_related('user').order_by('pk')
+    accounts = annotate_balance_as_of(accounts, start - timedelta(days=1), 'opening')
+    accounts = annotate_balance_as_of(accounts, end, 'closing')
+    rows = (
+        filter_date_range(Transaction.objects.filter(account_id__gte=low, account_id__lt=high), start, end)
+        .order_by('account_id', 'timestamp', 'pk')
+        .values_list('account_id', *FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    grouped = groupby(rows, key=lambda row: row[0])
+    pending = next(grouped, None)
+    archived = archived_rows_for_month(low, high, start)
+
+    written = []
+    transaction_count = 0
+    for account in accounts.iterator(chunk_size=chunk_size):
+        account_rows = []
+        while pending is not None and pending[0] < account.pk:
+            # Rows of accounts deleted since the account query ran.
+            pending = next(grouped, None)
+        if pending is not None and pending[0] == account.pk:
+            account_rows = [row[1:] for row in pending[1]]
+            pending = next(grouped, None)
+        if account.pk in archived:
+            # Loan rows of an archived month are still in the table.
+            account_rows = heapq.merge(account_rows, archived[account.pk], key=lambda row: (row[1], row[0]))
+        lines = [
+            {
+                'timestamp': timezone.localtime(timestamp),
+                'type': type_labels.get(transaction_type, ''),
+                'amount': amount,
+                'delta': signed_delta(transaction_type, amount, loan_approve),
+                'balance': balance,
+            }
+            for _, timestamp, transaction_type, amount, balance, loan_approve in account_rows
+        ]
+
+        context = {
+            'account': account,
+            'user': account.user,
+            'period_start': start,
+            'period_end': end,
+            'opening_balance': account.opening,
+            'closing_balance': account.closing,
+            'lines': lines,
+            'credits': sum((line['delta'] for line in lines if line['delta'] > 0), 0),
+            'debits': -sum((line['delta'] for line in lines if line['delta'] < 0), 0),
+        }
+        base = os.path.join(directory, str(account.account_no))
+        write_file(f'{base}.html', html_template.render(context))
+        write_file(f'{base}.txt', text_template.render(context))
+        transaction_count += len(lines)
+        written.append({
+            'account_no': account.account_no,
+            'transactions': len(lines),
+            'opening_balance': str(account.opening),
+            'closing_balance': str(account.closing),
+        })
+
+    manifest = {
+        'low': low,
+        'high': high,
+        'directory': os.path.relpath(directory, period_directory(root, period)),
+        'accounts': len(written),
+        'transactions': transaction_count,
+        'statements': written,
+    }
+    write_file(os.path.join(directory, DONE_MARKER), json.dumps(manifest))
+    return manifest
@@ -0,0 +1,14 @@
+from decimal import Decimal, InvalidOperation
+
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def bdt(value):
+    """``1234.5`` -> ``1,234.50``; same output as ``floatformat:2|intcomma`` at a fraction of the cost."""
+    try:
+        return format(Decimal(value), ',.2f')
+    except (InvalidOperation, TypeError, ValueError):
+        return ''
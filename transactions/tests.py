@@ -1,3 +1,761 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.directory import lookup_account
+from accounts.models import UserBankAccount
+from core.idempotency import recent_responses
+from core.models import IdempotencyKey, OutboxEmail
+from .balances import balance_as_of, opening_balance
+from .bank_status import invalidate_bank_status, is_bank_bankrupt
+from .constants import DEPOSIT, INTEREST, LOAN, TRANSFER, TRANSFER_SENT
+from .filters import day_start, filter_date_range, previous_month
+from .models import ArchiveSegment, BalanceCheckpoint, Bank, InterestAccrual, Transaction, TransactionRollup
+from .posting import (
+    InsufficientFunds, approve_loan, approve_loans, pay_loan, post_batch_transfer, post_deposit, post_transfer,
+    post_withdrawal, request_loan,
+)
+
+
+def create_account(username, balance=0, **kwargs):
+    user = User.objects.create_user(username=username, password='pass12345', email=f'{username}@example.com')
+    kwargs.setdefault('account_type', 'Savings')
+    return UserBankAccount.objects.create(
+        user=user, gender='Male', account_no=1000000 + user.pk, balance=balance, **kwargs
+    )
+
+
+class PostingTests(TestCase):
+    def setUp(self):
+        self.sender = create_account('sender', balance=Decimal('1000'))
+        self.recipient = create_account('recipient', balance=Decimal('50'))
+
+    def test_transfer_moves_money_and_records_both_legs(self):
+        debit, credit = post_transfer(self.sender, self.recipient, Decimal('300'))
+
+        self.sender.refresh_from_db()
+        self.recipient.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal('700'))
+        self.assertEqual(self.recipient.balance, Decimal('350'))
+        self.assertEqual((debit.amount, debit.balance_after_transaction), (Decimal('-300'), Decimal('700')))
+        self.assertEqual((credit.amount, credit.balance_after_transaction), (Decimal('300'), Decimal('350')))
+        self.assertEqual(Transaction.objects.filter(transaction_type=TRANSFER).count(), 2)
+
+    def test_overdraft_rolls_back(self):
+        with self.assertRaises(InsufficientFunds):
+            post_transfer(self.sender, self.recipient, Decimal('5000'))
+
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal('1000'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_deposit_view_posts_and_queues_email(self):
+        self.client.force_login(self.sender.user)
+        response = self.client.post(reverse('deposit_money'), {'amount': '600', 'transaction_type': DEPOSIT})
+
+        self.assertRedirects(response, reverse('transaction_report'), fetch_redirect_response=False)
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal('1600'))
+        self.assertEqual(Transaction.objects.get().balance_after_transaction, Decimal('1600'))
+        self.assertEqual(OutboxEmail.objects.get().to, 'sender@example.com')
+
+
+class BankStatusTests(TestCase):
+    def setUp(self):
+        invalidate_bank_status()
+        self.addCleanup(invalidate_bank_status)
+
+    def test_flag_is_cached_until_bank_is_saved(self):
+        self.assertFalse(is_bank_bankrupt())
+        with self.assertNumQueries(0):
+            self.assertFalse(is_bank_bankrupt())
+
+        bank = Bank.objects.get(id=1)
+        bank.bankrupt = True
+        bank.save()
+        self.assertTrue(is_bank_bankrupt())
+
+
+class TransactionReportTests(TestCase):
+    def setUp(self):
+        self.account = create_account('reporter', balance=Decimal('0'))
+        for amount in range(1, 8):
+            post_deposit(self.account, Decimal(amount))
+        self.client.force_login(self.account.user)
+
+    def test_cursor_pages_walk_the_history(self):
+        url = reverse('transaction_report')
+        first = self.client.get(url, {'page_size': 3})
+        self.assertEqual([t.amount for t in first.context['transactions']], [1, 2, 3])
+        self.assertNotIn('previous_page_query', first.context)
+
+        second = self.client.get(f"{url}?{first.context['next_page_query']}")
+        self.assertEqual([t.amount for t in second.context['transactions']], [4, 5, 6])
+
+        back = self.client.get(f"{url}?{second.context['previous_page_query']}")
+        self.assertEqual([t.amount for t in back.context['transactions']], [1, 2, 3])
+
+    def test_bdt_matches_floatformat_intcomma(self):
+        template = Template('{% load humanize money %}{{ v|floatformat:2|intcomma }} {{ v|bdt }}')
+        for value in (Decimal('0'), Decimal('1234567.5'), Decimal('-2500.25'), 7):
+            old, new = template.render(Context({'v': value})).split()
+            self.assertEqual(old, new)
+
+
+class DateRangeFilterTests(TestCase):
+    def test_end_date_is_inclusive_and_half_open(self):
+        account = create_account('ranger')
+        inside = post_deposit(account, Decimal('1'))
+        outside = post_deposit(account, Decimal('2'))
+        end_of_day = day_start(date(2024, 5, 31)) + timedelta(days=1) - timedelta(microseconds=1)
+        Transaction.objects.filter(pk=inside.pk).update(timestamp=end_of_day)
+        Transaction.objects.filter(pk=outside.pk).update(timestamp=day_start(date(2024, 6, 1)))
+
+        queryset = filter_date_range(Transaction.objects.all(), date(2024, 5, 1), date(2024, 5, 31))
+        self.assertEqual(list(queryset), [inside])
+
+
+class StatementExportTests(TestCase):
+    def test_streams_csv_and_jsonl(self):
+        account = create_account('exporter')
+        post_deposit(account, Decimal('500'))
+        post_deposit(account, Decimal('250'))
+        self.client.force_login(account.user)
+
+        response = self.client.get(reverse('transaction_export'), {'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,timestamp,transaction_type,amount,balance_after_transaction')
+        self.assertEqual([line.split(',')[-1] for line in lines[1:]], ['500.00', '750.00'])
+
+        response = self.client.get(reverse('transaction_export'), {'format': 'jsonl'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['transaction_type'] for row in rows], ['Deposite', 'Deposite'])
+
+
+class BalanceCheckpointTests(TestCase):
+    def test_postings_keep_daily_checkpoints(self):
+        account = create_account('checkpointed', balance=Decimal('100'))
+        today = timezone.localdate()
+        post_deposit(account, Decimal('50'))
+        post_withdrawal(account, Decimal('30'))
+
+        checkpoint = BalanceCheckpoint.objects.get(account=account)
+        self.assertEqual((checkpoint.day, checkpoint.opening_balance, checkpoint.closing_balance), (today, 100, 120))
+        self.assertEqual(opening_balance(account, today), Decimal('100'))
+        self.assertEqual(balance_as_of(account, today), Decimal('120'))
+        self.assertEqual(balance_as_of(account, today + timedelta(days=3)), Decimal('120'))
+
+    def test_backfill_rebuilds_checkpoints_from_history(self):
+        account = create_account('backfilled')
+        post_deposit(account, Decimal('500'))
+        post_withdrawal(account, Decimal('200'))
+        BalanceCheckpoint.objects.all().delete()
+
+        call_command('backfill_balance_checkpoints', stdout=StringIO())
+        checkpoint = BalanceCheckpoint.objects.get(account=account)
+        self.assertEqual((checkpoint.opening_balance, checkpoint.closing_balance), (0, 300))
+
+
+class ReconcileLedgerTests(TestCase):
+    def test_reports_accounts_that_drifted_from_their_history(self):
+        clean = create_account('clean')
+        drifted = create_account('drifted')
+        post_deposit(clean, Decimal('900'))
+        post_withdrawal(clean, Decimal('100'))
+        post_transfer(clean, drifted, Decimal('300'))
+        UserBankAccount.objects.filter(pk=drifted.pk).update(balance=Decimal('350'))
+
+        out = StringIO()
+        call_command('reconcile_ledger', workers=1, shard_size=1, stdout=out)
+        self.assertIn(f'Account {drifted.account_no}: balance 350.00, ledger 300.00, difference 50.00', out.getvalue())
+        self.assertNotIn(f'Account {clean.account_no}', out.getvalue())
+        self.assertIn('1 discrepancies', out.getvalue())
+
+
+class BatchTransferTests(TestCase):
+    def setUp(self):
+        self.sender = create_account('payroll', balance=Decimal('1000'))
+        self.first = create_account('first')
+        self.second = create_account('second')
+        self.client.force_login(self.sender.user)
+
+    def test_valid_items_are_posted_together(self):
+        payload = [
+            {'account_no': self.first.account_no, 'amount': '100'},
+            {'account_no': self.second.account_no, 'amount': '250.50'},
+            {'account_no': 42, 'amount': '10'},
+            {'account_no': self.first.account_no, 'amount': '-5'},
+        ]
+        response = self.client.post(reverse('batch_transfer'), payload, content_type='application/json')
+
+        data = response.json()
+        self.assertEqual((data['posted'], data['failed'], data['total']), (2, 2, '350.50'))
+        self.assertEqual([item['status'] for item in data['results']], ['ok', 'ok', 'error', 'error'])
+        self.sender.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal('649.50'))
+        self.assertEqual(self.second.balance, Decimal('250.50'))
+        self.assertEqual(Transaction.objects.filter(transaction_type=TRANSFER).count(), 4)
+        self.assertEqual(OutboxEmail.objects.count(), 3)
+
+    def test_batch_over_balance_is_rejected_whole(self):
+        payload = {'transfers': [
+            {'account_no': self.first.account_no, 'amount': '600'},
+            {'account_no': self.second.account_no, 'amount': '600'},
+        ]}
+        response = self.client.post(reverse('batch_transfer'), payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal('1000'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_recipient_deleted_before_posting_is_rejected(self):
+        def delete_then_post(sender, transfers):
+            UserBankAccount.objects.filter(pk=self.second.pk).delete()
+            return post_batch_transfer(sender, transfers)
+
+        payload = [
+            {'account_no': self.first.account_no, 'amount': '100'},
+            {'account_no': self.second.account_no, 'amount': '100'},
+        ]
+        with mock.patch('transactions.views.post_batch_transfer', delete_then_post):
+            response = self.client.post(reverse('batch_transfer'), payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], f'Account {self.second.account_no} no longer exists.')
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_malformed_csv_is_rejected(self):
+        upload = SimpleUploadedFile('batch.csv', b'account_no,amount\n' + b'"' + b'1' * (csv.field_size_limit() + 1) + b'",10\n')
+        response = self.client.post(reverse('batch_transfer'), {'file': upload})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Transaction.objects.exists())
+
+
+class ReadAPITests(TestCase):
+    def setUp(self):
+        self.account = create_account('poller')
+        post_deposit(self.account, Decimal('500'))
+        self.client.force_login(self.account.user)
+
+    def test_unchanged_account_answers_304(self):
+        response = self.client.get(reverse('api_transactions'))
+        self.assertEqual(response.json()['results'][0]['amount'], '500.00')
+        etag = response['ETag']
+
+        cached = self.client.get(reverse('api_transactions'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+
+        post_deposit(self.account, Decimal('700'))
+        changed = self.client.get(reverse('api_transactions'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()['results']), 2)
+
+    def test_balance_endpoint(self):
+        response = self.client.get(reverse('api_balance'))
+        self.assertEqual(response.json()['balance'], '500.00')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RecipientLookupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sender = create_account('sender', balance=Decimal('1000'))
+        self.recipient = create_account('recipient')
+        User.objects.filter(pk=self.recipient.user_id).update(first_name='Joyant', last_name='Sarker')
+        self.client.force_login(self.sender.user)
+
+    def test_endpoint_answers_with_a_masked_name(self):
+        url = reverse('api_recipient')
+        found = self.client.get(url, {'account_no': self.recipient.account_no}).json()
+        self.assertEqual(found, {
+            'account_no': self.recipient.account_no, 'exists': True, 'name': 'J***** S*****', 'own_account': False,
+        })
+        self.assertFalse(self.client.get(url, {'account_no': 42}).json()['exists'])
+        self.assertEqual(self.client.get(url, {'account_no': 'abc'}).status_code, 400)
+
+    def test_lookups_are_cached_until_an_account_is_created(self):
+        lookup_account(1234567)
+        with self.assertNumQueries(0):
+            self.assertIsNone(lookup_account(1234567))
+        with self.captureOnCommitCallbacks(execute=True):
+            account = create_account('latecomer')
+            account.account_no = 1234567
+            account.save()
+        self.assertEqual(lookup_account(1234567)['pk'], account.pk)
+
+    def test_renumbered_accounts_stop_resolving_under_the_old_number(self):
+        old_number = self.recipient.account_no
+        self.assertEqual(lookup_account(old_number)['pk'], self.recipient.pk)
+        account = UserBankAccount.objects.get(pk=self.recipient.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            account.account_no = 7654321
+            account.save()
+        self.assertIsNone(lookup_account(old_number))
+        self.assertEqual(lookup_account(7654321)['pk'], self.recipient.pk)
+
+    def test_transfer_form_rejects_non_numeric_account_numbers(self):
+        response = self.client.post(reverse('transfer'), {'account_number': '12ab', 'amount': '10'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('account_number', response.context['form'].errors)
+
+    def test_transfer_posts_to_the_cached_recipient(self):
+        lookup_account(self.recipient.account_no)
+        self.client.post(reverse('transfer'), {'account_number': self.recipient.account_no, 'amount': '300'})
+        self.recipient.refresh_from_db()
+        self.assertEqual(self.recipient.balance, Decimal('300'))
+
+
+class LoanCounterTests(TestCase):
+    def setUp(self):
+        self.account = create_account('borrower', balance=Decimal('1000'))
+
+    def test_counters_follow_request_approval_and_payment(self):
+        loan = request_loan(self.account, Decimal('400'))
+        self.account.refresh_from_db()
+        self.assertEqual((self.account.pending_loan_count, self.account.active_loan_count), (1, 0))
+
+        approve_loan(loan)
+        self.account.refresh_from_db()
+        self.assertEqual((self.account.pending_loan_count, self.account.active_loan_count), (0, 1))
+        self.assertEqual(self.account.outstanding_loan_principal, Decimal('400'))
+        self.assertEqual(self.account.balance, Decimal('1400'))
+
+        pay_loan(loan)
+        self.account.refresh_from_db()
+        self.assertEqual((self.account.active_loan_count, self.account.outstanding_loan_principal), (0, 0))
+        self.assertEqual(self.account.balance, Decimal('1000'))
+
+    def test_limit_is_checked_against_the_counter(self):
+        UserBankAccount.objects.filter(pk=self.account.pk).update(active_loan_count=2)
+        self.client.force_login(self.account.user)
+
+        response = self.client.post(reverse('loan_request'), {'amount': '100'})
+        self.assertContains(response, 'You have crossed your loan limit.')
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_rebuild_repairs_drifted_counters(self):
+        loan = request_loan(self.account, Decimal('250'))
+        Transaction.objects.filter(pk=loan.pk).update(loan_approve=True)
+        UserBankAccount.objects.filter(pk=self.account.pk).update(pending_loan_count=5)
+
+        call_command('rebuild_loan_counters', stdout=StringIO())
+        self.account.refresh_from_db()
+        self.assertEqual(
+            (self.account.active_loan_count, self.account.pending_loan_count, self.account.outstanding_loan_principal),
+            (1, 0, Decimal('250')),
+        )
+
+    def test_rebuild_counts_loans_posted_before_it_locks(self):
+        select_for_update = UserBankAccount.objects.select_for_update
+        requested = []
+
+        def request_then_lock(*args, **kwargs):
+            # A loan request that commits just before the rebuild takes its locks.
+            if not requested:
+                requested.append(True)
+                request_loan(self.account, Decimal('300'))
+            return select_for_update(*args, **kwargs)
+
+        with mock.patch.object(UserBankAccount.objects, 'select_for_update', request_then_lock):
+            call_command('rebuild_loan_counters', stdout=StringIO())
+        self.account.refresh_from_db()
+        self.assertEqual((self.account.pending_loan_count, self.account.active_loan_count), (1, 0))
+
+
+class LoanApprovalAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('staff', 'staff@example.com', 'pass12345')
+        self.client.force_login(self.admin)
+        self.first = create_account('first', balance=Decimal('100'))
+        self.second = create_account('second')
+        self.loans = [
+            request_loan(self.first, Decimal('200')),
+            request_loan(self.first, Decimal('300')),
+            request_loan(self.second, Decimal('50')),
+        ]
+
+    def test_bulk_action_credits_each_account_once(self):
+        url = reverse('admin:transactions_transaction_changelist')
+        data = {'action': 'approve_selected_loans', '_selected_action': [loan.pk for loan in self.loans]}
+        self.client.post(url, data)
+        self.client.post(url, data)
+
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.first.balance, Decimal('600'))
+        self.assertEqual(self.second.balance, Decimal('50'))
+        self.assertEqual((self.first.active_loan_count, self.first.pending_loan_count), (2, 0))
+        self.assertEqual(
+            sorted(Transaction.objects.values_list('balance_after_transaction', flat=True)),
+            [Decimal('50'), Decimal('300'), Decimal('600')],
+        )
+        self.assertEqual(OutboxEmail.objects.filter(subject='Loan Approval').count(), 3)
+
+    def test_saving_an_approved_loan_again_does_not_credit_twice(self):
+        loan = self.loans[2]
+        url = reverse('admin:transactions_transaction_change', args=[loan.pk])
+        data = {
+            'account': self.second.pk, 'amount': '50', 'balance_after_transaction': '0',
+            'transaction_type': LOAN, 'loan_approve': 'on',
+        }
+        self.client.post(url, data)
+        self.client.post(url, data)
+
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.balance, Decimal('50'))
+        self.assertEqual(OutboxEmail.objects.filter(subject='Loan Approval').count(), 1)
+
+    def test_approved_loans_cannot_be_edited_back(self):
+        loan = approve_loan(self.loans[2])
+        url = reverse('admin:transactions_transaction_change', args=[loan.pk])
+        self.client.post(url, {'amount': '5', 'balance_after_transaction': '0'})
+
+        loan.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((loan.amount, loan.loan_approve), (Decimal('50'), True))
+        self.assertEqual((self.second.balance, self.second.active_loan_count), (Decimal('50'), 1))
+
+    def test_loans_added_in_the_admin_are_counted(self):
+        url = reverse('admin:transactions_transaction_add')
+        data = {
+            'account': self.second.pk, 'amount': '80', 'balance_after_transaction': '0',
+            'transaction_type': LOAN, 'loan_approve': 'on',
+        }
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+
+        self.second.refresh_from_db()
+        self.assertEqual((self.second.pending_loan_count, self.second.active_loan_count), (1, 1))
+        self.assertEqual((self.second.balance, self.second.outstanding_loan_principal), (Decimal('80'), Decimal('80')))
+
+        approve_loan(self.loans[1])
+        approve_loan(self.loans[0])
+        data['account'] = self.first.pk
+        response = self.client.post(url, data)
+        self.assertContains(response, 'crossed its loan limit')
+
+    def test_loan_limit_reached_by_another_admin_is_reported(self):
+        def approve_then_request(account, amount):
+            # Another admin approves this account's loans after the form was validated.
+            approve_loans([loan.pk for loan in self.loans[:2]])
+            return request_loan(account, amount)
+
+        url = reverse('admin:transactions_transaction_add')
+        data = {
+            'account': self.first.pk, 'amount': '80', 'balance_after_transaction': '0', 'transaction_type': LOAN,
+        }
+        with mock.patch('transactions.admin.request_loan', approve_then_request):
+            response = self.client.post(url, data, follow=True)
+
+        self.assertContains(response, 'This account has crossed its loan limit.')
+        self.assertEqual(Transaction.objects.filter(account=self.first, transaction_type=LOAN).count(), 2)
+
+
+class TransactionAdminTests(TestCase):
+    def test_changelist_query_count_does_not_grow_with_rows(self):
+        self.client.force_login(User.objects.create_superuser('staff', 'staff@example.com', 'pass12345'))
+        url = reverse('admin:transactions_transaction_changelist')
+        accounts = [create_account(f'holder{i}') for i in range(6)]
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            return len(queries)
+
+        post_deposit(accounts[0], Decimal('500'))
+        few = count_queries()
+        for account in accounts:
+            post_deposit(account, Decimal('500'))
+        self.assertEqual(count_queries(), few)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        recent_responses.clear()
+        self.addCleanup(recent_responses.clear)
+        self.account = create_account('retrier', balance=Decimal('1000'))
+        self.recipient = create_account('payee')
+        self.client.force_login(self.account.user)
+
+    def test_retried_deposit_is_replayed_without_posting_again(self):
+        data = {'amount': '600', 'transaction_type': DEPOSIT}
+        first = self.client.post(reverse('deposit_money'), data, HTTP_IDEMPOTENCY_KEY='abc')
+        recent_responses.clear()  # force the database path
+        retry = self.client.post(reverse('deposit_money'), data, HTTP_IDEMPOTENCY_KEY='abc')
+
+        with self.assertNumQueries(2):  # session and user only
+            again = self.client.post(reverse('deposit_money'), data, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(retry.status_code, first.status_code)
+        self.assertEqual(retry['Location'], first['Location'])
+        self.assertEqual(again['Idempotent-Replayed'], 'true')
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('1600'))
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_key_reused_on_another_endpoint_is_rejected(self):
+        self.client.post(reverse('deposit_money'), {'amount': '600'}, HTTP_IDEMPOTENCY_KEY='k1')
+        response = self.client.post(
+            reverse('transfer'), {'account_number': self.recipient.account_no, 'amount': '10'},
+            HTTP_IDEMPOTENCY_KEY='k1',
+        )
+        self.assertEqual(response.status_code, 422)
+
+    def test_expired_keys_are_purged(self):
+        self.client.post(reverse('deposit_money'), {'amount': '600'}, HTTP_IDEMPOTENCY_KEY='old')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        call_command('purge_idempotency_keys', batch_size=1, stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class InterestAccrualTests(TestCase):
+    def setUp(self):
+        self.savings = create_account('saver', balance=Decimal('4000'))
+        self.current = create_account('spender', balance=Decimal('4000'), account_type='Current')
+        for account in (self.savings, self.current):
+            BalanceCheckpoint.objects.create(
+                account=account, day=date(2024, 8, 31), opening_balance=0, closing_balance=Decimal('1000'),
+            )
+            BalanceCheckpoint.objects.create(
+                account=account, day=date(2024, 9, 11), opening_balance=Decimal('1000'), closing_balance=Decimal('4000'),
+            )
+
+    def accrue(self):
+        call_command('accrue_interest', period='2024-09', rate=Decimal('0.0365'), workers=1, stdout=StringIO())
+
+    def test_interest_is_weighted_by_daily_balance(self):
+        self.accrue()
+        # 10 days at 1000 and 20 days at 4000 is 90000 BDT-days; 0.0365 / 365 of that is 9.00.
+        interest = Transaction.objects.get(account=self.savings, transaction_type=INTEREST)
+        self.assertEqual(interest.amount, Decimal('9.00'))
+        self.savings.refresh_from_db()
+        self.assertEqual(self.savings.balance, Decimal('4009.00'))
+        self.assertFalse(Transaction.objects.filter(account=self.current).exists())
+
+    def test_rerunning_a_period_does_not_pay_twice(self):
+        self.accrue()
+        self.accrue()
+        self.assertEqual(InterestAccrual.objects.get().amount, Decimal('9.00'))
+        self.assertEqual(Transaction.objects.filter(transaction_type=INTEREST).count(), 1)
+
+
+class StatementGenerationTests(TestCase):
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output)
+        self.account = create_account('stated')
+        self.quiet = create_account('quiet', balance=Decimal('25'))
+        post_deposit(self.account, Decimal('800'))
+        post_withdrawal(self.account, Decimal('300'))
+        # Move the activity into last month, the latest period that has ended.
+        self.period = previous_month(timezone.localdate())
+        day = self.period + timedelta(days=9)
+        Transaction.objects.update(timestamp=day_start(day) + timedelta(hours=12))
+        BalanceCheckpoint.objects.update(day=day)
+
+    def generate(self, **options):
+        out = StringIO()
+        call_command(
+            'generate_statements', period=f'{self.period:%Y-%m}', output=self.output,
+            workers=1, shard_size=1, stdout=out, **options
+        )
+        return out.getvalue()
+
+    def test_writes_statements_and_a_manifest(self):
+        self.generate()
+        period_dir = os.path.join(self.output, f'{self.period:%Y}', f'{self.period:%m}')
+        with open(os.path.join(period_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+        self.assertEqual((manifest['accounts'], manifest['transactions']), (2, 2))
+
+        shard = next(s for s in manifest['shards'] if s['transactions'])
+        with open(os.path.join(period_dir, shard['directory'], f'{self.account.account_no}.txt')) as f:
+            text = f.read()
+        self.assertIn('Opening balance: BDT 0.00', text)
+        self.assertIn('Total debits:    BDT 300.00', text)
+        self.assertIn('Closing balance: BDT 500.00', text)
+        self.assertTrue(os.path.exists(os.path.join(period_dir, shard['directory'], f'{self.account.account_no}.html')))
+
+    def test_rerun_skips_finished_shards(self):
+        self.generate()
+        self.assertIn('2 of 2 shards already done', self.generate())
+        self.assertNotIn('already done', self.generate(force=True))
+
+    def test_periods_that_have_not_ended_are_refused(self):
+        with self.assertRaisesMessage(CommandError, 'has not ended yet'):
+            call_command('generate_statements', period=f'{timezone.localdate():%Y-%m}', output=self.output, workers=1)
+
+
+class ArchiveTransactionsTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(TRANSACTION_ARCHIVE_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.account = create_account('archived')
+        old_deposit = post_deposit(self.account, Decimal('1000'))
+        old_withdrawal = post_withdrawal(self.account, Decimal('200'))
+        old_loan = request_loan(self.account, Decimal('5000'))
+        self.recent = post_deposit(self.account, Decimal('50'))
+        for row, moment in (
+            (old_deposit, timezone.make_aware(datetime(2023, 3, 5, 10))),
+            (old_withdrawal, timezone.make_aware(datetime(2023, 3, 20, 10))),
+            (old_loan, timezone.make_aware(datetime(2023, 4, 2, 10))),
+        ):
+            Transaction.objects.filter(pk=row.pk).update(timestamp=moment)
+        self.archived_ids = [old_deposit.pk, old_withdrawal.pk]
+        self.loan = old_loan
+        self.client.force_login(self.account.user)
+
+    def archive(self):
+        call_command('archive_transactions', before='2024-01', workers=1, stdout=StringIO())
+
+    def test_moves_old_months_to_a_segment_and_keeps_loans(self):
+        self.archive()
+        self.assertEqual(
+            set(Transaction.objects.filter(account=self.account).values_list('pk', flat=True)),
+            {self.loan.pk, self.recent.pk},
+        )
+        segment = ArchiveSegment.objects.get(account=self.account)
+        self.assertEqual((segment.month, segment.row_count, segment.net_total), (date(2023, 3, 1), 2, Decimal('800')))
+        self.assertEqual(balance_as_of(self.account, date(2023, 3, 31)), Decimal('800'))
+
+        out = StringIO()
+        call_command('reconcile_ledger', workers=1, shard_size=1, stdout=out)
+        self.assertIn('0 discrepancies', out.getvalue())
+
+        output = os.path.join(self.root, 'statements')
+        call_command('generate_statements', period='2023-03', output=output, workers=1, stdout=StringIO())
+        with open(os.path.join(output, '2023', '03', 'manifest.json')) as f:
+            self.assertEqual(json.load(f)['transactions'], 2)
+
+        self.archive()
+        self.assertEqual(ArchiveSegment.objects.get().row_count, 2)
+
+    def test_report_pages_through_archived_and_live_rows(self):
+        self.archive()
+        first = self.client.get(reverse('transaction_report'), {'page_size': 2})
+        self.assertEqual([row.pk for row in first.context['transactions']], self.archived_ids)
+
+        second = self.client.get(f"{reverse('transaction_report')}?{first.context['next_page_query']}")
+        self.assertEqual([row.pk for row in second.context['transactions']], [self.loan.pk, self.recent.pk])
+
+        back = self.client.get(f"{reverse('transaction_report')}?{second.context['previous_page_query']}")
+        self.assertEqual([row.pk for row in back.context['transactions']], self.archived_ids)
+
+        export = self.client.get(reverse('transaction_export'), {'start_date': '2023-03-01', 'end_date': '2023-04-30'})
+        lines = b''.join(export.streaming_content).decode().splitlines()
+        self.assertEqual([int(line.split(',')[0]) for line in lines[2:]], [*self.archived_ids, self.loan.pk])
+
+    def test_json_api_includes_archived_rows(self):
+        self.archive()
+        first = self.client.get(reverse('api_transactions'), {'page_size': 2}).json()
+        self.assertEqual([row['id'] for row in first['results']], self.archived_ids)
+
+        second = self.client.get(reverse('api_transactions'), {'page_size': 2, 'after': first['next']}).json()
+        self.assertEqual([row['id'] for row in second['results']], [self.loan.pk, self.recent.pk])
+
+    def test_segments_archived_with_output_are_read_from_there(self):
+        output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output, ignore_errors=True)
+        call_command('archive_transactions', before='2024-01', output=output, workers=1, stdout=StringIO())
+        segment = ArchiveSegment.objects.get(account=self.account)
+        self.assertTrue(os.path.exists(os.path.join(output, segment.path)))
+        self.assertFalse(os.path.exists(os.path.join(self.root, segment.path)))
+
+        response = self.client.get(reverse('transaction_report'), {'start_date': '2023-03-01', 'end_date': '2023-03-31'})
+        self.assertEqual([row.pk for row in response.context['transactions']], self.archived_ids)
+        api = self.client.get(reverse('api_transactions'), {'start_date': '2023-03-01', 'end_date': '2023-03-31'}).json()
+        self.assertEqual([row['id'] for row in api['results']], self.archived_ids)
+
+    def test_rebuild_reads_archived_rows(self):
+        other = create_account('counterparty')
+        legs = post_transfer(self.account, other, Decimal('70'))
+        Transaction.objects.filter(pk__in=[leg.pk for leg in legs]).update(timestamp=timezone.make_aware(datetime(2023, 3, 25, 10)))
+        call_command('rebuild_transaction_rollups', workers=1, stdout=StringIO())
+        before = set(TransactionRollup.objects.values_list('account_id', 'period_type', 'period', 'transaction_type', 'count', 'total'))
+
+        self.archive()
+        TransactionRollup.objects.all().delete()
+        call_command('rebuild_transaction_rollups', workers=1, stdout=StringIO())
+        after = set(TransactionRollup.objects.values_list('account_id', 'period_type', 'period', 'transaction_type', 'count', 'total'))
+        self.assertEqual(after, before)
+        self.assertIn((self.account.pk, TransactionRollup.MONTHLY, date(2023, 3, 1), TRANSFER_SENT, 1, Decimal('70')), after)
+
+    def test_recent_ranges_do_not_read_segments(self):
+        self.archive()
+        shutil.rmtree(self.root)
+        response = self.client.get(reverse('transaction_report'), {'start_date': timezone.localdate().isoformat()})
+        self.assertEqual([row.pk for row in response.context['transactions']], [self.recent.pk])
+
+
+class TransactionRollupTests(TestCase):
+    def setUp(self):
+        self.account = create_account('rolled')
+        self.other = create_account('other')
+        post_deposit(self.account, Decimal('1000'))
+        post_withdrawal(self.account, Decimal('30'))
+        post_transfer(self.account, self.other, Decimal('20'))
+        loan = request_loan(self.account, Decimal('500'))
+        pay_loan(approve_loan(loan))
+        self.client.force_login(self.account.user)
+
+    def totals(self, **params):
+        response = self.client.get(reverse('transaction_report'), params)
+        return {row['label']: (row['transactions'], row['amount']) for row in response.context['totals']}
+
+    def buckets(self):
+        return set(TransactionRollup.objects.values_list('account_id', 'period_type', 'period', 'transaction_type', 'count', 'total'))
+
+    def test_postings_maintain_per_type_totals(self):
+        self.assertEqual(self.totals(), {
+            'Deposite': (1, Decimal('1000')),
+            'Withdrawal': (1, Decimal('30')),
+            'Transfer Sent': (1, Decimal('20')),
+            'Loan Paid': (1, Decimal('500')),
+        })
+
+    def test_sent_and_received_transfers_are_totalled_apart(self):
+        post_transfer(self.other, self.account, Decimal('15'))
+        post_transfer(self.other, self.account, Decimal('5'))
+        totals = self.totals()
+        self.assertEqual(totals['Transfer Received'], (2, Decimal('20')))
+        self.assertEqual(totals['Transfer Sent'], (1, Decimal('20')))
+        self.assertEqual(list(totals), ['Deposite', 'Withdrawal', 'Loan Paid', 'Transfer Received', 'Transfer Sent'])
+
+    def test_rebuild_matches_incremental_rollups(self):
+        incremental = self.buckets()
+        TransactionRollup.objects.all().delete()
+        call_command('rebuild_transaction_rollups', workers=1, chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.buckets(), incremental)
+
+    def test_totals_follow_the_selected_range(self):
+        deposit = Transaction.objects.get(account=self.account, transaction_type=DEPOSIT)
+        Transaction.objects.filter(pk=deposit.pk).update(timestamp=timezone.make_aware(datetime(2024, 1, 31, 12)))
+        call_command('rebuild_transaction_rollups', workers=1, stdout=StringIO())
+
+        self.assertEqual(self.totals(start_date='2024-01-15', end_date='2024-03-31'), {'Deposite': (1, Decimal('1000'))})
+        self.assertEqual(self.totals(start_date='2024-02-01', end_date='2024-03-31'), {})
+        self.assertNotIn('Deposite', self.totals(start_date=timezone.localdate().isoformat()))
@@ -1,12 +1,18 @@
 from django.urls import path
-from .views import DepositMoneyView, WithdrawMoneyView, TransactionReportView, LoanRequestView, LoanListView, PayLoanView, MoneyTransferView
+from .views import DepositMoneyView, WithdrawMoneyView, TransactionReportView, StatementExportView, LoanRequestView, LoanListView, PayLoanView, MoneyTransferView, BatchTransferView, BalanceAPIView, RecipientLookupAPIView, TransactionListAPIView, LoanListAPIView
 
 urlpatterns = [
     path('deposit/', DepositMoneyView.as_view(), name="deposit_money"),
     path('report/', TransactionReportView.as_view(), name="transaction_report"),
+    path('report/export/', StatementExportView.as_view(), name="transaction_export"),
     path('withdraw/', WithdrawMoneyView.as_view(), name="withdraw_money"),
     path('loan_request/', LoanRequestView.as_view(), name="loan_request"),
     path('loans/', LoanListView.as_view(), name="loan_list"),
     path('loan/<int:loan_id>/', PayLoanView.as_view(), name="loan_pay"),
     path('transfer/', MoneyTransferView.as_view(), name='transfer'),
+    path('transfer/batch/', BatchTransferView.as_view(), name='batch_transfer'),
+    path('api/balance/', BalanceAPIView.as_view(), name='api_balance'),
+    path('api/transactions/', TransactionListAPIView.as_view(), name='api_transactions'),
+    path('api/loans/', LoanListAPIView.as_view(), name='api_loans'),
+    path('api/recipient/', RecipientLookupAPIView.as_view(), name='api_recipient'),
 ]
@@ -1,28 +1,52 @@
 from django.shortcuts import get_object_or_404, redirect
 from django.views.generic import CreateView, ListView, FormView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from .models import Transaction, Bank
+from .models import Transaction
 from .forms import DepositForm, WithdrawForm, LoanRequestForm, TransferForm
-from .constants import DEPOSIT, WITHDRAWAL, LOAN, LOAN_PAID, TRANSFER
+from .constants import DEPOSIT, WITHDRAWAL, LOAN, LOAN_PAID, TRANSFER, TRANSACTION_TYPE
 from django.contrib import messages
-from django.http import HttpResponse
-from datetime import datetime
+import csv
+import json
+import io
+import time
+from decimal import Decimal, InvalidOperation
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.utils.http import urlencode
 from django.db.models import Sum
 from django.views import View
+import hashlib
+import heapq
+from django.utils.decorators import method_decorator
+from django.utils.cache import patch_cache_control
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import condition
 from django.urls import reverse_lazy
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
+from django.db import transaction
+from core.outbox import queue_email, queue_emails, render_email
+from core.idempotency import IdempotencyMixin
+from accounts.balance_cache import get_balance
+from accounts.directory import lookup_account
+from accounts.models import UserBankAccount
+from .archive import ArchiveReader
+from .bank_status import is_bank_bankrupt
+from .balances import opening_balance, closing_balance
+from .filters import filter_date_range, parse_date_range
+from .pagination import KeysetPaginator, get_page_size
+from .rollups import rollup_totals
+from .posting import PostingError, InsufficientFunds, LoanLimitExceeded, request_loan, post_deposit, post_withdrawal, post_transfer, post_batch_transfer, pay_loan
 
-def send_transaction_email(user, amount, subject, template):
-    message = render_to_string(template, {
+def render_transaction_email(user, amount, template):
+    return render_email(template, {
         'user' : user,
         'amount' : amount,
     })
-    send_email = EmailMultiAlternatives(subject, message, to=[user.email])
-    send_email.attach_alternative(message, "text/html")
-    send_email.send()
 
-class TransactionCreateMixin(LoginRequiredMixin, CreateView):
+def send_transaction_email(user, amount, subject, template):
+    message = render_transaction_email(user, amount, template)
+    queue_email(subject, message, user.email, html_message=message)
+
+class TransactionCreateMixin(IdempotencyMixin, LoginRequiredMixin, CreateView):
     template_name = 'transactions/transaction_form.html'
     model = Transaction
     title = ''
@@ -30,7 +54,8 @@ class TransactionCreateMixin(LoginRequiredMixin, CreateView):
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        kwargs['account'] = self.request.user.account  # Pass the account to the form
+        # Lazy, so rendering the empty form doesn't load the account row.
+        kwargs['account'] = SimpleLazyObject(lambda: self.request.user.account)
         return kwargs
     
     def get_context_data(self, **kwargs):
@@ -46,11 +71,11 @@ class DepositMoneyView(TransactionCreateMixin):
         initial = {'transaction_type': DEPOSIT}
         return initial
     
+    @transaction.atomic
     def form_valid(self, form):
         amount = form.cleaned_data.get('amount')
         account = self.request.user.account
-        account.balance += amount
-        account.save(update_fields=['balance'])
+        self.object = post_deposit(account, amount)
 
         messages.success(self.request, f'{amount} BDT was deposited to your account successfully.')
         # mail_subject = 'Deposite Message'
@@ -63,7 +88,7 @@ class DepositMoneyView(TransactionCreateMixin):
         # send_email.attach_alternative(message, "text/html")
         # send_email.send()
         send_transaction_email(self.request.user, amount, "Deposite Message", "transactions/deposite_email.html")
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
 class WithdrawMoneyView(TransactionCreateMixin):
     form_class = WithdrawForm
@@ -73,19 +98,22 @@ class WithdrawMoneyView(TransactionCreateMixin):
         initial = {'transaction_type': WITHDRAWAL}
         return initial
     
+    @transaction.atomic
     def form_valid(self, form):
-        bank = get_object_or_404(Bank)
-        if bank.bankrupt:
+        if is_bank_bankrupt():
             messages.error(self.request, 'The bank is bankrupt. No transfers or withdrawals allowed.')
             return self.form_invalid(form)
         amount = form.cleaned_data.get('amount')
         account = self.request.user.account
-        account.balance -= amount
-        account.save(update_fields=['balance'])
+        try:
+            self.object = post_withdrawal(account, amount)
+        except InsufficientFunds as e:
+            messages.error(self.request, f'You have {e.balance} BDT in your account. You cannot withdraw more than your account balance.')
+            return self.form_invalid(form)
 
         messages.success(self.request, f'Successfully withdrawn {amount} BDT from your account.')
         send_transaction_email(self.request.user, amount, "Withdrawal Message", "transactions/withdrawal_email.html")
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
     
 class LoanRequestView(TransactionCreateMixin):
     form_class = LoanRequestForm
@@ -95,73 +123,148 @@ class LoanRequestView(TransactionCreateMixin):
         initial = {'transaction_type': LOAN}
         return initial
     
+    @transaction.atomic
     def form_valid(self, form):
-        bank = get_object_or_404(Bank, id=1)
-        if bank.bankrupt:
+        if is_bank_bankrupt():
             messages.error(self.request, 'The bank is bankrupt. No transfers or withdrawals allowed.')
             return self.form_invalid(form)
         amount = form.cleaned_data.get('amount')
-        current_loan_count = Transaction.objects.filter(
-            account=self.request.user.account,
-            transaction_type=LOAN,
-            loan_approve=True
-        ).count()
-        
-        if current_loan_count >= 2:
+        try:
+            self.object = request_loan(self.request.user.account, amount)
+        except LoanLimitExceeded:
             return HttpResponse("You have crossed your loan limit.")
         
         messages.success(self.request, f'Loan request for {amount} BDT has been successfully sent to admin.')
         send_transaction_email(self.request.user, amount, "Loan Message", "transactions/loan_email.html")
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
 class TransactionReportView(LoginRequiredMixin, ListView):
     template_name = "transactions/transaction_report.html"
     model = Transaction
     context_object_name = 'transactions'
+    use_replica = True
 
     def get_queryset(self):
         queryset = super().get_queryset().filter(account=self.request.user.account)
+        start_date, end_date = parse_date_range(self.request.GET)
+        return filter_date_range(queryset, start_date, end_date)
 
-        start_date_str = self.request.GET.get('start_date')
-        end_date_str = self.request.GET.get('end_date')
+    def get_page_query(self, **cursor):
+        params = {
+            key: self.request.GET[key]
+            for key in ('start_date', 'end_date', 'page_size')
+            if self.request.GET.get(key)
+        }
+        params.update(cursor)
+        return urlencode(params)
 
-        if start_date_str and end_date_str:
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-            end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        account = self.request.user.account
+        start_date, end_date = parse_date_range(self.request.GET)
+        page = KeysetPaginator(get_page_size(self.request.GET)).paginate(
+            self.object_list,
+            after=self.request.GET.get('after'),
+            before=self.request.GET.get('before'),
+            archive=ArchiveReader(account, start_date, end_date),
+        )
+        context['transactions'] = context['object_list'] = page.items
+        context['page'] = page
+        if page.next_cursor:
+            context['next_page_query'] = self.get_page_query(after=page.next_cursor)
+        if page.previous_cursor:
+            context['previous_page_query'] = self.get_page_query(before=page.previous_cursor)
+        if start_date:
+            context['opening_balance'] = opening_balance(account, start_date)
+        if end_date:
+            context['closing_balance'] = closing_balance(account, end_date)
+        context['totals'] = rollup_totals(account, start_date, end_date)
+        context['account'] = account
+        context['balance'] = get_balance(self.request.user)
+        return context
+    
+class Echo:
+    """File-like object whose write() hands the line back to the caller."""
+    def write(self, value):
+        return value
+
+class StatementExportView(LoginRequiredMixin, View):
+    use_replica = True
+    columns = ['id', 'timestamp', 'transaction_type', 'amount', 'balance_after_transaction']
 
-            queryset = queryset.filter(
-                timestamp__date__gte=start_date,
-                timestamp__date__lte=end_date
+    def get_rows(self):
+        account = self.request.user.account
+        start_date, end_date = parse_date_range(self.request.GET)
+        queryset = filter_date_range(Transaction.objects.using(self.db).filter(account=account), start_date, end_date)
+        chunk_size = getattr(settings, 'STATEMENT_EXPORT_CHUNK_SIZE', 2000)
+        type_labels = dict(TRANSACTION_TYPE)
+        rows = queryset.order_by('timestamp', 'pk').values_list(*self.columns).iterator(chunk_size=chunk_size)
+        archive = ArchiveReader(account, start_date, end_date, using=self.db)
+        if archive:
+            archived = (
+                (row.pk, row.timestamp, row.transaction_type, row.amount, row.balance_after_transaction)
+                for row in archive.rows()
             )
+            rows = heapq.merge(rows, archived, key=lambda row: (row[1], row[0]))
+        for pk, timestamp, transaction_type, amount, balance in rows:
+            yield [pk, timestamp.isoformat(), type_labels.get(transaction_type, ''), str(amount), str(balance)]
 
-        return queryset.distinct()
+    def get_opening_row(self):
+        start_date, end_date = parse_date_range(self.request.GET)
+        if start_date:
+            balance = opening_balance(self.request.user.account, start_date)
+            return ['', start_date.isoformat(), 'Opening Balance', '', str(balance)]
+        return None
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['account'] = self.request.user.account
-        context['balance'] = self.request.user.account.balance
-        return context
+    def stream_csv(self):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.columns)
+        opening_row = self.get_opening_row()
+        if opening_row:
+            yield writer.writerow(opening_row)
+        for row in self.get_rows():
+            yield writer.writerow(row)
+
+    def stream_jsonl(self):
+        opening_row = self.get_opening_row()
+        if opening_row:
+            yield json.dumps(dict(zip(self.columns, opening_row))) + '\n'
+        for row in self.get_rows():
+            yield json.dumps(dict(zip(self.columns, row))) + '\n'
+
+    def get(self, request):
+        # Rows are read while streaming, after the request's routing has been
+        # torn down, so pick the database now.
+        self.db = Transaction.objects.all().db
+        account_no = request.user.account.account_no
+        if request.GET.get('format') == 'jsonl':
+            response = StreamingHttpResponse(self.stream_jsonl(), content_type='application/x-ndjson')
+            extension = 'jsonl'
+        else:
+            response = StreamingHttpResponse(self.stream_csv(), content_type='text/csv')
+            extension = 'csv'
+        response['Content-Disposition'] = f'attachment; filename="statement-{account_no}.{extension}"'
+        return response
     
 class PayLoanView(LoginRequiredMixin, View):
     title = 'Loan List'
+
+    @transaction.atomic
     def get(self, request, loan_id):
-        loan = get_object_or_404(Transaction, id=loan_id)
+        loan = get_object_or_404(Transaction, id=loan_id, account=request.user.account)
 
         if loan.loan_approve:
-            user_account = loan.account
-            if loan.amount <= user_account.balance:
-                user_account.balance -= loan.amount
-                loan.balance_after_transaction = user_account.balance
-                user_account.save()
-                loan.transaction_type = LOAN_PAID
-                loan.save()
-                send_transaction_email(self.request.user, loan.amount, "Loan Paid Message", "transactions/loan_paid_email.html")
-                return redirect('loan_list')
-                # messages.success(request, f'Loan of {loan.amount} BDT has been successfully paid off.')
-
-            else:
+            try:
+                loan = pay_loan(loan)
+            except InsufficientFunds:
                 messages.error(self.request, "Loan amount exceeds the available balance.")
                 return redirect('loan_list')
+            except PostingError:
+                return redirect('loan_list')
+            request.user.account.balance = loan.account.balance
+            send_transaction_email(self.request.user, loan.amount, "Loan Paid Message", "transactions/loan_paid_email.html")
+            return redirect('loan_list')
+            # messages.success(request, f'Loan of {loan.amount} BDT has been successfully paid off.')
         
         return redirect('loan_list')
 
@@ -169,16 +272,19 @@ class LoanListView(LoginRequiredMixin, ListView):
     model = Transaction
     template_name = "transactions/loan_request.html"
     context_object_name = "loans"
+    use_replica = True
 
     def get_queryset(self):
         user_account = self.request.user.account
+        if not user_account.active_loan_count and not user_account.pending_loan_count:
+            return Transaction.objects.none()
         queryset = Transaction.objects.filter(
             account=user_account,
-            transaction_type=3
+            transaction_type=LOAN
         )
         return queryset
 
-class MoneyTransferView(FormView):
+class MoneyTransferView(IdempotencyMixin, FormView):
     template_name = 'transactions/transfer.html'
     form_class = TransferForm
     title = 'Money Transfer'
@@ -192,33 +298,15 @@ class MoneyTransferView(FormView):
         kwargs = super().get_form_kwargs()
         kwargs.pop('instance', None)
         kwargs.pop('account', None)
-        kwargs['sender_account'] = self.request.user.account
+        kwargs['sender_account'] = SimpleLazyObject(lambda: self.request.user.account)
         return kwargs
     
     def create_transaction(self, sender_account, recipient_account, amount):
-        sender_account.balance -= amount
-        recipient_account.balance += amount
-        sender_account.save()
-        recipient_account.save()
-        
-        Transaction.objects.create(
-            account=sender_account,
-            amount=-amount,  
-            balance_after_transaction=sender_account.balance,
-            transaction_type=TRANSFER
-        )
-        
-        Transaction.objects.create(
-            account=recipient_account,
-            amount=amount,  
-            balance_after_transaction=recipient_account.balance,
-            transaction_type=TRANSFER
-        )
+        return post_transfer(sender_account, recipient_account, amount)
     
+    @transaction.atomic
     def form_valid(self, form):
-        bank, created = Bank.objects.get_or_create(id=1)
-
-        if bank.bankrupt:
+        if is_bank_bankrupt():
             messages.error(self.request, 'The bank is bankrupt. No transfers or withdrawals allowed.')
             return self.form_invalid(form)
 
@@ -235,11 +323,18 @@ class MoneyTransferView(FormView):
             messages.error(self.request, "Insufficient balance or invalid transfer amount.")
             return self.form_invalid(form)
 
-        self.create_transaction(
-            sender_account=sender_account,
-            recipient_account=recipient_account,
-            amount=amount
-        )
+        try:
+            self.create_transaction(
+                sender_account=sender_account,
+                recipient_account=recipient_account,
+                amount=amount
+            )
+        except InsufficientFunds:
+            messages.error(self.request, "Insufficient balance or invalid transfer amount.")
+            return self.form_invalid(form)
+        except PostingError as e:
+            messages.error(self.request, str(e))
+            return self.form_invalid(form)
 
         messages.success(self.request, f'Successfully transferred {amount} BDT.')
         send_transaction_email(self.request.user, amount, "Balance Transfer Message", "transactions/balance_transfer_sender.html")
@@ -248,3 +343,212 @@ class MoneyTransferView(FormView):
         
     def form_invalid(self, form):
         return super().form_invalid(form)
+
+class BatchTransferView(IdempotencyMixin, LoginRequiredMixin, View):
+    """Pay many recipients at once from a JSON list or an uploaded CSV.
+
+    Accepts ``[{"account_no": ..., "amount": ...}, ...]`` (optionally wrapped
+    in ``{"transfers": [...]}``) or a CSV ``file`` with ``account_no,amount``
+    columns. Valid items are posted together in one atomic unit; the response
+    lists the outcome of every item.
+    """
+
+    def parse_items(self, request):
+        if 'file' in request.FILES:
+            reader = csv.DictReader(io.TextIOWrapper(request.FILES['file'], encoding='utf-8'))
+            return list(reader)
+        data = json.loads(request.body)
+        if isinstance(data, dict):
+            data = data.get('transfers', [])
+        return data
+
+    def clean_item(self, item):
+        try:
+            account_no = int(item['account_no'])
+            amount = Decimal(str(item['amount']))
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            return None, None, 'Each item needs a numeric account_no and amount.'
+        if not amount.is_finite() or amount <= 0:
+            return account_no, None, 'The transfer amount must be positive'
+        if amount.as_tuple().exponent < -2:
+            return account_no, None, 'The transfer amount can have at most 2 decimal places.'
+        return account_no, amount, None
+
+    def post(self, request):
+        started = time.perf_counter()
+        try:
+            items = self.parse_items(request)
+        except (ValueError, UnicodeDecodeError, csv.Error):
+            return JsonResponse({'error': 'Send a JSON list of transfers or a CSV file.'}, status=400)
+        if not isinstance(items, list) or not items:
+            return JsonResponse({'error': 'No transfers given.'}, status=400)
+        max_items = getattr(settings, 'BATCH_TRANSFER_MAX_ITEMS', 5000)
+        if len(items) > max_items:
+            return JsonResponse({'error': f'At most {max_items} transfers per batch.'}, status=400)
+        if is_bank_bankrupt():
+            return JsonResponse({'error': 'The bank is bankrupt. No transfers or withdrawals allowed.'}, status=403)
+
+        sender_account = request.user.account
+        cleaned = [self.clean_item(item) if isinstance(item, dict) else (None, None, 'Invalid item.') for item in items]
+        recipients = UserBankAccount.objects.select_related('user').in_bulk(
+            {account_no for account_no, amount, error in cleaned if not error},
+            field_name='account_no',
+        )
+
+        results = []
+        transfers = []
+        for index, (account_no, amount, error) in enumerate(cleaned):
+            recipient = recipients.get(account_no)
+            if not error and recipient is None:
+                error = 'Recipient account not found!'
+            if not error and recipient.pk == sender_account.pk:
+                error = 'Same account money transfer cannot be possible.'
+            results.append({
+                'index': index,
+                'account_no': account_no,
+                'amount': str(amount) if amount is not None else None,
+                'status': 'error' if error else 'ok',
+                'error': error,
+            })
+            if not error:
+                transfers.append((index, recipient, amount))
+
+        total = sum(amount for index, recipient, amount in transfers)
+        if transfers:
+            try:
+                with transaction.atomic():
+                    rows = post_batch_transfer(
+                        sender_account, [(recipient, amount) for index, recipient, amount in transfers]
+                    )
+                    self.queue_notifications(request.user, transfers, total)
+            except InsufficientFunds as e:
+                return JsonResponse({
+                    'error': f'Insufficient balance! You have {e.balance} BDT in your account',
+                    'total': str(total),
+                    'results': results,
+                }, status=400)
+            except PostingError as e:
+                return JsonResponse({'error': str(e), 'total': str(total), 'results': results}, status=400)
+            for (index, recipient, amount), (debit, credit) in zip(transfers, rows):
+                results[index]['transaction_id'] = debit.pk
+
+        elapsed = time.perf_counter() - started
+        return JsonResponse({
+            'posted': len(transfers),
+            'failed': len(results) - len(transfers),
+            'total': str(total),
+            'balance': str(sender_account.balance),
+            'seconds': round(elapsed, 4),
+            'transfers_per_second': round(len(transfers) / elapsed, 1) if elapsed else None,
+            'results': results,
+        })
+
+    def queue_notifications(self, user, transfers, total):
+        emails = []
+        for index, recipient, amount in transfers:
+            message = render_transaction_email(recipient.user, amount, "transactions/balance_transfer_receiver.html")
+            emails.append(("Balance Added Message", message, recipient.user.email, message))
+        message = render_transaction_email(user, total, "transactions/balance_transfer_sender.html")
+        emails.append(("Balance Transfer Message", message, user.email, message))
+        queue_emails(emails)
+
+
+def account_etag(request, *args, **kwargs):
+    """ETag for the JSON read API, built from the account's balance and latest transaction.
+
+    Every balance change either adds a transaction or changes the balance, so
+    this is one indexed single-row read and lets polling clients get a 304
+    without the rows being loaded.
+    """
+    if not request.user.is_authenticated:
+        return None
+    account = request.user.account
+    latest = (
+        Transaction.objects.filter(account=account)
+        .order_by('-timestamp', '-pk')
+        .values_list('pk', 'timestamp')
+        .first()
+    )
+    raw = f'{account.pk}:{account.balance}:{latest}:{request.GET.urlencode()}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def transaction_to_dict(transaction):
+    return {
+        'id': transaction.pk,
+        'timestamp': transaction.timestamp.isoformat(),
+        'transaction_type': transaction.get_transaction_type_display(),
+        'amount': str(transaction.amount),
+        'balance_after_transaction': str(transaction.balance_after_transaction),
+        'loan_approve': transaction.loan_approve,
+    }
+
+
+etag_conditional = method_decorator(condition(etag_func=account_etag), name='get')
+
+
+class AccountAPIView(LoginRequiredMixin, View):
+    raise_exception = True
+    use_replica = True
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class RecipientLookupAPIView(AccountAPIView):
+    """Check a transfer recipient before the form is submitted."""
+    use_replica = False
+
+    def get(self, request):
+        try:
+            account_no = int(request.GET.get('account_no', ''))
+        except ValueError:
+            return JsonResponse({'error': 'account_no must be a number.'}, status=400)
+        entry = lookup_account(account_no)
+        if entry is None:
+            return JsonResponse({'account_no': account_no, 'exists': False})
+        return JsonResponse({
+            'account_no': account_no,
+            'exists': True,
+            'name': entry['name'],
+            'own_account': entry['user_id'] == request.user.pk,
+        })
+
+
+@etag_conditional
+class BalanceAPIView(AccountAPIView):
+    def get(self, request):
+        account = request.user.account
+        return JsonResponse({
+            'account_no': account.account_no,
+            'account_type': account.account_type,
+            'balance': str(account.balance),
+        })
+
+
+@etag_conditional
+class TransactionListAPIView(AccountAPIView):
+    def get(self, request):
+        account = request.user.account
+        start_date, end_date = parse_date_range(request.GET)
+        queryset = filter_date_range(Transaction.objects.filter(account=account), start_date, end_date)
+        page = KeysetPaginator(get_page_size(request.GET)).paginate(
+            queryset,
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+            archive=ArchiveReader(account, start_date, end_date),
+        )
+        return JsonResponse({
+            'results': [transaction_to_dict(transaction) for transaction in page.items],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        })
+
+
+@etag_conditional
+class LoanListAPIView(AccountAPIView):
+    def get(self, request):
+        loans = Transaction.objects.filter(account=request.user.account, transaction_type=LOAN)
+        return JsonResponse({'results': [transaction_to_dict(loan) for loan in loans]})